@@ -5,21 +5,88 @@ Collects stock movement data for the past 14 days
 
 import yfinance as yf
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import os
 import time
-from typing import Dict, List
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List
+
+# Optional NSE holiday calendar; without it only weekends are skipped
+try:
+    import pandas_market_calendars as mcal
+    NSE_CALENDAR_AVAILABLE = True
+except ImportError:
+    NSE_CALENDAR_AVAILABLE = False
 
 class HistoricalDataBackfill:
+    # History-file count columns, in the order of the movement count arrays
+    MOVEMENT_COLUMNS = ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5',
+                        'down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus', 'neutral']
+    
     def __init__(self, data_file='stock_movements_history.csv'):
         self.data_file = data_file
+        # Columnar copy of the history for fast reads (dashboard prefers it when up to date)
+        self.parquet_file = os.path.splitext(data_file)[0] + '.parquet'
+        self.session = self._create_session()
+        # On-disk cache for the stock list and price downloads
+        self.cache_dir = '.cache'
+        self.cache_ttl = 24 * 60 * 60  # seconds
         
+    def _create_session(self) -> requests.Session:
+        """Pooled HTTP session with retry/backoff, shared by all Yahoo Finance downloads"""
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
+        
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                          '(KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        return session
+    
+    def _cache_path(self, key: str) -> str:
+        """Cache file for a request key"""
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.parquet')
+    
+    def _read_cache(self, key: str):
+        """Return the cached DataFrame for a key, or None if missing or older than the TTL"""
+        path = self._cache_path(key)
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > self.cache_ttl:
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            return None
+    
+    def _write_cache(self, key: str, df: pd.DataFrame):
+        """Persist a DataFrame under a request key"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df.to_parquet(self._cache_path(key), engine='pyarrow', compression='snappy')
+    
     def fetch_nifty_500_stocks(self) -> List[str]:
         """Fetch list of Nifty 500 stocks"""
+        url = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
+        df = self._read_cache(url)
+        if df is not None:
+            print(f"Using cached Nifty 500 stock list ({len(df)} stocks)")
+            return [symbol + '.NS' for symbol in df['Symbol'].tolist()]
+        
         try:
             print("Fetching Nifty 500 stock list...")
-            url = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
-            df = pd.read_csv(url)
+            # Only Symbol and Industry are used; ~50 sector names fit a category
+            df = pd.read_csv(url, usecols=['Symbol', 'Industry'],
+                             dtype={'Symbol': 'string', 'Industry': 'category'})
+            df['Industry'] = df['Industry'].cat.add_categories(['Other']).fillna('Other')
+            self._write_cache(url, df)
             stocks = [symbol + '.NS' for symbol in df['Symbol'].tolist()]
             print(f"Found {len(stocks)} stocks")
             return stocks
@@ -42,88 +109,87 @@ class HistoricalDataBackfill:
         return [stock + '.NS' for stock in major_stocks]
     
     def get_trading_days(self, days_back=14) -> List[datetime]:
-        """Get list of trading days (exclude weekends)"""
-        trading_days = []
-        current_date = datetime.now().date()
-        
-        for i in range(days_back + 1):
-            date = current_date - timedelta(days=i)
-            # Exclude weekends (Saturday=5, Sunday=6)
-            if date.weekday() < 5:
-                trading_days.append(date)
-        
-        trading_days.reverse()  # Oldest first
-        return trading_days
-    
-    def calculate_movements_for_date(self, stocks: List[str], target_date: datetime) -> Dict:
-        """Calculate stock movements for a specific date"""
-        movements = {
-            'up_15+': 0, 'up_10_15': 0, 'up_5_10': 0, 'up_3_5': 0,
-            'down_3_5': 0, 'down_5_10': 0, 'down_10_15': 0, 'down_15+': 0,
-            'neutral': 0
-        }
-        
-        successful = 0
-        
-        # Download data for all stocks at once (more efficient)
-        print(f"   Downloading data for {len(stocks)} stocks...")
-        
-        # Use a date range that includes the target date and previous day
-        end_date = target_date + timedelta(days=1)
-        start_date = target_date - timedelta(days=5)  # Get extra days for safety
-        
-        for i, stock in enumerate(stocks):
-            try:
-                # Download historical data
-                data = yf.download(stock, start=start_date, end=end_date, progress=False, auto_adjust=True)
-                
-                if data is not None and len(data) >= 2:
-                    # Find the target date in the data
-                    data.index = pd.to_datetime(data.index).date
-                    
-                    if target_date in data.index:
-                        # Get target date index
-                        target_idx = data.index.get_loc(target_date)
-                        
-                        if target_idx > 0:
-                            prev_close = float(data['Close'].iloc[target_idx - 1])
-                            curr_close = float(data['Close'].iloc[target_idx])
-                            
-                            pct_change = ((curr_close - prev_close) / prev_close) * 100
-                            category = self._categorize_movement(pct_change)
-                            movements[category] += 1
-                            successful += 1
-                
-                # Progress indicator every 100 stocks
-                if (i + 1) % 100 == 0:
-                    print(f"   Processed {i + 1}/{len(stocks)} stocks... ({successful} successful)")
-                    
-            except Exception as e:
-                continue
-        
-        print(f"   ✅ Successfully processed {successful} stocks for {target_date}")
-        return movements
+        """Get list of trading days (exclude weekends and, if available, NSE holidays)"""
+        end_date = pd.Timestamp(datetime.now().date())
+        start_date = end_date - pd.Timedelta(days=days_back)
+        
+        if NSE_CALENDAR_AVAILABLE:
+            schedule = mcal.get_calendar('NSE').schedule(start_date=start_date, end_date=end_date)
+            return schedule.index.date.tolist()
+        
+        return pd.bdate_range(start_date, end_date).date.tolist()  # Oldest first
     
-    def _categorize_movement(self, pct_change: float) -> str:
-        """Categorize stock movement by percentage"""
-        if pct_change >= 15:
-            return 'up_15+'
-        elif pct_change >= 10:
-            return 'up_10_15'
-        elif pct_change >= 5:
-            return 'up_5_10'
-        elif pct_change >= 3:
-            return 'up_3_5'
-        elif pct_change <= -15:
-            return 'down_15+'
-        elif pct_change <= -10:
-            return 'down_10_15'
-        elif pct_change <= -5:
-            return 'down_5_10'
-        elif pct_change <= -3:
-            return 'down_3_5'
+    def download_closes(self, stocks: List[str], trading_days: List[datetime]) -> pd.DataFrame:
+        """Download closing prices for all stocks over the whole backfill window in one call"""
+        # Start a few days early so the first trading day has a previous close
+        start_date = min(trading_days) - timedelta(days=5)
+        end_date = max(trading_days) + timedelta(days=1)
+        
+        # Re-runs within the cache TTL reuse the same bars instead of re-downloading
+        cache_key = f"{','.join(stocks)}:{start_date}:{end_date}"
+        closes = self._read_cache(cache_key)
+        
+        if closes is not None:
+            print(f"\nUsing cached data for {len(stocks)} stocks ({start_date} to {end_date})")
         else:
-            return 'neutral'
+            print(f"\nDownloading data for {len(stocks)} stocks ({start_date} to {end_date})...")
+            panel = yf.download(stocks, start=start_date, end=end_date, group_by='ticker',
+                                threads=True, progress=False, auto_adjust=True,
+                                session=self.session)
+            
+            # (dates x tickers) frame of closing prices; float32 is plenty for % changes
+            closes = panel.xs('Close', level=1, axis=1).astype(np.float32)
+            del panel  # free the unused OHLV columns before processing
+            # Windows reaching today are not cached: during market hours today's bar is an
+            # intraday price, and a re-run would record it as the final close
+            if closes.notna().any().any() and max(trading_days).date() < datetime.now().date():
+                self._write_cache(cache_key, closes)
+        
+        # Normalize the index once so trading days can be looked up directly
+        closes.index = pd.to_datetime(closes.index).normalize()
+        return closes
+    
+    def calculate_movements(self, pct_changes: pd.DataFrame, trading_days: List[datetime]) -> tuple:
+        """Calculate movement counts (days x MOVEMENT_COLUMNS) for all trading days at once"""
+        # (days x tickers) changes; days without market data become all-NaN rows
+        day_changes = pct_changes.reindex(pd.DatetimeIndex(trading_days)).to_numpy()
+        valid = ~np.isnan(day_changes)
+        
+        # Give each day its own block of categories so a single bincount counts every day
+        n_days, n_categories = len(trading_days), len(self.MOVEMENT_COLUMNS)
+        categories = self._categorize_movements(day_changes) + np.arange(n_days)[:, None] * n_categories
+        movements_mat = np.bincount(categories[valid], minlength=n_days * n_categories)
+        
+        return movements_mat.reshape(n_days, n_categories).astype(np.int32), valid.sum(axis=1)
+    
+    def _categorize_movements(self, pct_changes: np.ndarray) -> np.ndarray:
+        """Map percentage changes to indexes into MOVEMENT_COLUMNS (all stocks at once)"""
+        # Bucket by magnitude so both sides keep inclusive thresholds (>= 3, <= -3, ...)
+        levels = np.digitize(np.abs(pct_changes), [3, 5, 10, 15])
+        # up_15_plus..up_3_5 are 0..3, down_3_5..down_15_plus are 4..7, neutral is 8
+        return np.where(levels == 0, 8, np.where(pct_changes >= 0, 4 - levels, 3 + levels))
+    
+    def _write_parquet(self, df: pd.DataFrame):
+        """Write the movement history as Snappy-compressed Parquet with typed columns"""
+        df = df.assign(date=pd.to_datetime(df['date']))
+        count_cols = df.columns.drop('date')
+        df[count_cols] = df[count_cols].astype(np.int32)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, self.parquet_file, compression='snappy')
+    
+    def save_history(self, df: pd.DataFrame):
+        """Save movement history to CSV and its Parquet copy"""
+        df.to_csv(self.data_file, index=False)
+        self._write_parquet(df)
+    
+    def convert_csv_to_parquet(self):
+        """One-time migration: create the Parquet copy of an existing CSV history"""
+        if not os.path.exists(self.data_file):
+            print(f"Error: {self.data_file} not found!")
+            return
+        
+        self._write_parquet(pd.read_csv(self.data_file))
+        print(f"✅ Converted {self.data_file} to {self.parquet_file}")
     
     def backfill_data(self, days_back=14):
         """Backfill historical data for the specified number of days"""
@@ -139,45 +205,38 @@ class HistoricalDataBackfill:
         print(f"\nFound {len(trading_days)} trading days to process")
         print(f"Date range: {trading_days[0]} to {trading_days[-1]}")
         
-        # Prepare data structure
-        all_data = []
+        # Download the whole window once; each day is then a slice of it
+        closes = self.download_closes(stocks, trading_days)
+        
+        # Percentage change vs the previous close for every stock and day at once; a
+        # stock that missed one session is compared with its last close before the gap,
+        # and days a stock didn't trade stay NaN so they drop out of the counts
+        pct_changes = closes.ffill(limit=1).pct_change(fill_method=None).mul(100).where(closes.notna())
+        
+        # Categorize and count every day in one pass
+        movements_mat, processed = self.calculate_movements(pct_changes, trading_days)
         
-        # Process each day
         for idx, trade_date in enumerate(trading_days, 1):
             print(f"\n[{idx}/{len(trading_days)}] Processing {trade_date.strftime('%Y-%m-%d (%A)')}...")
             
-            movements = self.calculate_movements_for_date(stocks, trade_date)
-            
-            # Prepare row
-            row = {
-                'date': trade_date,
-                'up_15_plus': movements['up_15+'],
-                'up_10_15': movements['up_10_15'],
-                'up_5_10': movements['up_5_10'],
-                'up_3_5': movements['up_3_5'],
-                'down_3_5': movements['down_3_5'],
-                'down_5_10': movements['down_5_10'],
-                'down_10_15': movements['down_10_15'],
-                'down_15_plus': movements['down_15+'],
-                'neutral': movements['neutral']
-            }
-            
-            all_data.append(row)
+            movements = movements_mat[idx - 1]
+            if processed[idx - 1] == 0:
+                print(f"   ⚠️  No market data for {trade_date}")
+            else:
+                print(f"   ✅ Successfully processed {processed[idx - 1]} stocks for {trade_date}")
             
             # Display summary
-            gainers = movements['up_15+'] + movements['up_10_15'] + movements['up_5_10'] + movements['up_3_5']
-            losers = movements['down_15+'] + movements['down_10_15'] + movements['down_5_10'] + movements['down_3_5']
+            gainers = int(movements[:4].sum())
+            losers = int(movements[4:8].sum())
             total_movers = gainers + losers
             breadth = (gainers / total_movers * 100) if total_movers > 0 else 50
             
             print(f"   Gainers: {gainers} | Losers: {losers} | Breadth: {breadth:.1f}%")
-            
-            # Small delay between days
-            time.sleep(1)
         
-        # Save to CSV
-        df = pd.DataFrame(all_data)
-        df.to_csv(self.data_file, index=False)
+        # Save to CSV + Parquet
+        df = pd.DataFrame(movements_mat, columns=self.MOVEMENT_COLUMNS)
+        df.insert(0, 'date', trading_days)
+        self.save_history(df)
         
         print("\n" + "="*70)
         print("✅ BACKFILL COMPLETE!")
@@ -5,23 +5,91 @@ Collects stock movement data AND sector performance for the past 14 days
 
 import yfinance as yf
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import os
+import shutil
 import time
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, List
 
+# Optional NSE holiday calendar; without it only weekends are skipped
+try:
+    import pandas_market_calendars as mcal
+    NSE_CALENDAR_AVAILABLE = True
+except ImportError:
+    NSE_CALENDAR_AVAILABLE = False
+
 class HistoricalDataBackfillWithSectors:
+    # History-file count columns, in the order of the movement count arrays
+    MOVEMENT_COLUMNS = ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5',
+                        'down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus', 'neutral']
+    
     def __init__(self, data_file='stock_movements_history.csv', sector_file='sector_movements_history.csv'):
         self.data_file = data_file
         self.sector_file = sector_file
+        # Columnar copies of the history for fast reads (dashboard prefers them when up to date)
+        self.parquet_file = os.path.splitext(data_file)[0] + '.parquet'
+        self.sector_parquet_file = os.path.splitext(sector_file)[0] + '.parquet'
+        self.session = self._create_session()
+        # On-disk cache for the stock list and price downloads
+        self.cache_dir = '.cache'
+        self.cache_ttl = 24 * 60 * 60  # seconds
+        
+    def _create_session(self) -> requests.Session:
+        """Pooled HTTP session with retry/backoff, shared by all Yahoo Finance downloads"""
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
         
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                          '(KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        return session
+    
+    def _cache_path(self, key: str) -> str:
+        """Cache file for a request key"""
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.parquet')
+    
+    def _read_cache(self, key: str):
+        """Return the cached DataFrame for a key, or None if missing or older than the TTL"""
+        path = self._cache_path(key)
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > self.cache_ttl:
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            return None
+    
+    def _write_cache(self, key: str, df: pd.DataFrame):
+        """Persist a DataFrame under a request key"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df.to_parquet(self._cache_path(key), engine='pyarrow', compression='snappy')
+    
     def fetch_nifty_500_stocks(self) -> pd.DataFrame:
         """Fetch list of Nifty 500 stocks with sector information"""
+        url = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
+        df = self._read_cache(url)
+        if df is not None:
+            print(f"Using cached Nifty 500 stock list ({len(df)} stocks across {df['Industry'].nunique()} sectors)")
+            return df
+        
         try:
             print("Fetching Nifty 500 stock list with sectors...")
-            url = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
-            df = pd.read_csv(url)
-            df['Industry'] = df['Industry'].fillna('Other')
+            # Only Symbol and Industry are used; ~50 sector names fit a category
+            df = pd.read_csv(url, usecols=['Symbol', 'Industry'],
+                             dtype={'Symbol': 'string', 'Industry': 'category'})
+            df['Industry'] = df['Industry'].cat.add_categories(['Other']).fillna('Other')
+            self._write_cache(url, df)
             print(f"Found {len(df)} stocks across {df['Industry'].nunique()} sectors")
             return df
         except Exception as e:
@@ -45,102 +113,126 @@ class HistoricalDataBackfillWithSectors:
         return pd.DataFrame(stocks_data)
     
     def get_trading_days(self, days_back=14) -> List[datetime]:
-        """Get list of trading days (exclude weekends)"""
-        trading_days = []
-        current_date = datetime.now().date()
-        
-        for i in range(days_back + 5):  # Add buffer for weekends
-            date = current_date - timedelta(days=i)
-            if date.weekday() < 5:  # Mon-Fri
-                trading_days.append(date)
-                if len(trading_days) >= days_back:
-                    break
-        
-        trading_days.reverse()  # Oldest first
-        return trading_days
-    
-    def calculate_movements_for_date(self, stocks_df: pd.DataFrame, target_date: datetime) -> tuple:
-        """Calculate stock movements and sector performance for a specific date"""
-        movements = {
-            'up_15+': 0, 'up_10_15': 0, 'up_5_10': 0, 'up_3_5': 0,
-            'down_3_5': 0, 'down_5_10': 0, 'down_10_15': 0, 'down_15+': 0,
-            'neutral': 0
-        }
+        """Get the last N trading days (exclude weekends and, if available, NSE holidays)"""
+        end_date = pd.Timestamp(datetime.now().date())
         
-        # Sector-wise movements
-        sectors = stocks_df['Industry'].unique()
-        sector_movements = {sector: {
-            'up_3+': 0, 'down_3+': 0, 'neutral': 0, 'total': 0
-        } for sector in sectors}
+        if NSE_CALENDAR_AVAILABLE:
+            # Look back far enough to cover weekends and holidays, then keep the last N
+            start_date = end_date - pd.Timedelta(days=days_back * 2 + 10)
+            schedule = mcal.get_calendar('NSE').schedule(start_date=start_date, end_date=end_date)
+            return schedule.index.date.tolist()[-days_back:]
+        
+        return pd.bdate_range(end=end_date, periods=days_back).date.tolist()  # Oldest first
+    
+    def download_closes(self, stocks_df: pd.DataFrame, trading_days: List[datetime]) -> pd.DataFrame:
+        """Download closing prices for all stocks over the whole backfill window in one call"""
+        tickers = [symbol + '.NS' for symbol in stocks_df['Symbol']]
         
-        successful = 0
-        end_date = target_date + timedelta(days=1)
-        start_date = target_date - timedelta(days=5)
+        # Start a few days early so the first trading day has a previous close
+        start_date = min(trading_days) - timedelta(days=5)
+        end_date = max(trading_days) + timedelta(days=1)
         
-        print(f"   Processing {len(stocks_df)} stocks...")
+        # Re-runs within the cache TTL reuse the same bars instead of re-downloading
+        cache_key = f"{','.join(tickers)}:{start_date}:{end_date}"
+        closes = self._read_cache(cache_key)
         
-        for i, row in stocks_df.iterrows():
-            stock = row['Symbol'] + '.NS'
-            sector = row['Industry']
+        if closes is not None:
+            print(f"\nUsing cached data for {len(tickers)} stocks ({start_date} to {end_date})")
+        else:
+            print(f"\nDownloading data for {len(tickers)} stocks ({start_date} to {end_date})...")
+            panel = yf.download(tickers, start=start_date, end=end_date, group_by='ticker',
+                                threads=True, progress=False, auto_adjust=True,
+                                session=self.session)
             
-            try:
-                data = yf.download(stock, start=start_date, end=end_date, progress=False, auto_adjust=True)
-                
-                if data is not None and len(data) >= 2:
-                    data.index = pd.to_datetime(data.index).date
-                    
-                    if target_date in data.index:
-                        target_idx = data.index.get_loc(target_date)
-                        
-                        if target_idx > 0:
-                            prev_close = float(data['Close'].iloc[target_idx - 1])
-                            curr_close = float(data['Close'].iloc[target_idx])
-                            pct_change = ((curr_close - prev_close) / prev_close) * 100
-                            
-                            # Overall categorization
-                            category = self._categorize_movement(pct_change)
-                            movements[category] += 1
-                            
-                            # Sector categorization
-                            sector_movements[sector]['total'] += 1
-                            if pct_change >= 3:
-                                sector_movements[sector]['up_3+'] += 1
-                            elif pct_change <= -3:
-                                sector_movements[sector]['down_3+'] += 1
-                            else:
-                                sector_movements[sector]['neutral'] += 1
-                            
-                            successful += 1
-                
-                if (i + 1) % 100 == 0:
-                    print(f"   Processed {i + 1}/{len(stocks_df)} stocks... ({successful} successful)")
-                    
-            except Exception as e:
-                continue
-        
-        print(f"   ✅ Successfully processed {successful} stocks for {target_date}")
-        return movements, sector_movements
+            # (dates x tickers) frame of closing prices; float32 is plenty for % changes
+            closes = panel.xs('Close', level=1, axis=1).astype(np.float32)
+            del panel  # free the unused OHLV columns before processing
+            if closes.notna().any().any():
+                self._write_cache(cache_key, closes)
+        
+        # Normalize the index once so trading days can be looked up directly
+        closes.index = pd.to_datetime(closes.index).normalize()
+        return closes
     
-    def _categorize_movement(self, pct_change: float) -> str:
-        """Categorize stock movement by percentage"""
-        if pct_change >= 15:
-            return 'up_15+'
-        elif pct_change >= 10:
-            return 'up_10_15'
-        elif pct_change >= 5:
-            return 'up_5_10'
-        elif pct_change >= 3:
-            return 'up_3_5'
-        elif pct_change <= -15:
-            return 'down_15+'
-        elif pct_change <= -10:
-            return 'down_10_15'
-        elif pct_change <= -5:
-            return 'down_5_10'
-        elif pct_change <= -3:
-            return 'down_3_5'
-        else:
-            return 'neutral'
+    def calculate_movements(self, stocks_df: pd.DataFrame, pct_changes: pd.DataFrame, trading_days: List[datetime]) -> tuple:
+        """Calculate movement counts and (days x sectors x [up 3%+, down 3%+, neutral]) counts for all days at once"""
+        # Integer sector code per stock, computed once (codes follow the order of unique())
+        sector_codes, sectors = pd.factorize(stocks_df['Industry'])
+        n_days, n_categories = len(trading_days), len(self.MOVEMENT_COLUMNS)
+        
+        # (days x tickers) changes; days without market data become all-NaN rows
+        day_changes = pct_changes.reindex(pd.DatetimeIndex(trading_days)).to_numpy()
+        valid = ~np.isnan(day_changes)
+        day_ids = np.broadcast_to(np.arange(n_days)[:, None], day_changes.shape)
+        
+        # Overall categorization: each day gets its own block so a single bincount counts every day
+        categories = self._categorize_movements(day_changes) + day_ids * n_categories
+        movements_mat = np.bincount(categories[valid], minlength=n_days * n_categories)
+        movements_mat = movements_mat.reshape(n_days, n_categories).astype(np.int32)
+        
+        # Sector categorization: up 3%+ (0), down 3%+ (1) or neutral (2), counted per day and sector
+        sector_of = pd.Series(sector_codes, index=stocks_df['Symbol'] + '.NS')
+        sector_ids = sector_of.reindex(pct_changes.columns).to_numpy()
+        sector_ids = np.broadcast_to(sector_ids, day_changes.shape)
+        buckets = np.where(day_changes >= 3, 0, np.where(day_changes <= -3, 1, 2))
+        
+        sector_mat = np.zeros((n_days, len(sectors), 3), dtype=np.int32)
+        np.add.at(sector_mat, (day_ids[valid], sector_ids[valid], buckets[valid]), 1)
+        
+        return movements_mat, sector_mat, valid.sum(axis=1)
+    
+    def _categorize_movements(self, pct_changes: np.ndarray) -> np.ndarray:
+        """Map percentage changes to indexes into MOVEMENT_COLUMNS (all stocks at once)"""
+        # Bucket by magnitude so both sides keep inclusive thresholds (>= 3, <= -3, ...)
+        levels = np.digitize(np.abs(pct_changes), [3, 5, 10, 15])
+        # up_15_plus..up_3_5 are 0..3, down_3_5..down_15_plus are 4..7, neutral is 8
+        return np.where(levels == 0, 8, np.where(pct_changes >= 0, 4 - levels, 3 + levels))
+    
+    def _write_parquet(self, movements_df: pd.DataFrame, sector_df: pd.DataFrame):
+        """Write both histories as Snappy-compressed Parquet with typed columns"""
+        movements_df = movements_df.assign(date=pd.to_datetime(movements_df['date']))
+        count_cols = movements_df.columns.drop('date')
+        movements_df[count_cols] = movements_df[count_cols].astype(np.int32)
+        table = pa.Table.from_pandas(movements_df, preserve_index=False)
+        pq.write_table(table, self.parquet_file, compression='snappy')
+        
+        sector_df = sector_df.assign(date=pd.to_datetime(sector_df['date']))
+        count_cols = ['up_3_plus', 'down_3_plus', 'neutral', 'total']
+        sector_df[count_cols] = sector_df[count_cols].astype(np.int32)
+        sector_df['year'] = sector_df['date'].dt.year
+        sector_df['month'] = sector_df['date'].dt.month
+        
+        # Sector history is a dataset partitioned as year=YYYY/month=M. save_history always
+        # writes the full history (as the CSV does), so clear the old dataset (or an old
+        # single-file copy) first; otherwise months from earlier, longer runs would linger
+        if os.path.isdir(self.sector_parquet_file):
+            shutil.rmtree(self.sector_parquet_file)
+        elif os.path.isfile(self.sector_parquet_file):
+            os.remove(self.sector_parquet_file)
+        # Dictionary-encode the low-cardinality sector names
+        table = pa.Table.from_pandas(sector_df, preserve_index=False)
+        pq.write_to_dataset(table, self.sector_parquet_file, partition_cols=['year', 'month'],
+                            existing_data_behavior='delete_matching', basename_template='part-{i}.parquet',
+                            compression='snappy', use_dictionary=['sector'])
+        # Partition writes don't touch the root, so bump it for the dashboard's freshness check
+        os.utime(self.sector_parquet_file)
+    
+    def save_history(self, movements_df: pd.DataFrame, sector_df: pd.DataFrame):
+        """Save movement and sector history to CSV and their Parquet copies"""
+        movements_df.to_csv(self.data_file, index=False)
+        sector_df.to_csv(self.sector_file, index=False)
+        self._write_parquet(movements_df, sector_df)
+    
+    def convert_csv_to_parquet(self):
+        """One-time migration: create Parquet copies of existing CSV histories"""
+        for csv_file in (self.data_file, self.sector_file):
+            if not os.path.exists(csv_file):
+                print(f"Error: {csv_file} not found!")
+                return
+        
+        self._write_parquet(pd.read_csv(self.data_file), pd.read_csv(self.sector_file))
+        print(f"✅ Converted {self.data_file} to {self.parquet_file}")
+        print(f"✅ Converted {self.sector_file} to {self.sector_parquet_file}")
     
     def backfill_data(self, days_back=14):
         """Backfill historical data with sector analysis"""
@@ -155,80 +247,69 @@ class HistoricalDataBackfillWithSectors:
         trading_days = self.get_trading_days(days_back)
         print(f"\nFound {len(trading_days)} trading days to process")
         print(f"Date range: {trading_days[0]} to {trading_days[-1]}")
-        print("\n⏱️  This will take 10-20 minutes. Processing...")
         
-        # Prepare data structures
-        all_movements = []
-        all_sector_movements = []
+        # Download the whole window once; each day is then a slice of it
+        closes = self.download_closes(stocks_df, trading_days)
+        
+        # Percentage change vs the previous close for every stock and day at once; a
+        # stock that missed one session is compared with its last close before the gap,
+        # and days a stock didn't trade stay NaN so they drop out of the counts
+        pct_changes = closes.ffill(limit=1).pct_change(fill_method=None).mul(100).where(closes.notna())
+        
+        # Categorize and count every day in one pass
+        sectors = stocks_df['Industry'].unique()
+        movements_mat, sector_mat, processed = self.calculate_movements(stocks_df, pct_changes, trading_days)
         
-        # Process each day
         for idx, trade_date in enumerate(trading_days, 1):
             print(f"\n[{idx}/{len(trading_days)}] Processing {trade_date.strftime('%Y-%m-%d (%A)')}...")
             
-            movements, sector_movements = self.calculate_movements_for_date(stocks_df, trade_date)
-            
-            # Store overall movements
-            all_movements.append({
-                'date': trade_date,
-                'up_15_plus': movements['up_15+'],
-                'up_10_15': movements['up_10_15'],
-                'up_5_10': movements['up_5_10'],
-                'up_3_5': movements['up_3_5'],
-                'down_3_5': movements['down_3_5'],
-                'down_5_10': movements['down_5_10'],
-                'down_10_15': movements['down_10_15'],
-                'down_15_plus': movements['down_15+'],
-                'neutral': movements['neutral']
-            })
-            
-            # Store sector movements
-            for sector, moves in sector_movements.items():
-                if moves['total'] > 0:
-                    breadth = (moves['up_3+'] / moves['total'] * 100)
-                    all_sector_movements.append({
-                        'date': trade_date,
-                        'sector': sector,
-                        'up_3_plus': moves['up_3+'],
-                        'down_3_plus': moves['down_3+'],
-                        'neutral': moves['neutral'],
-                        'total': moves['total'],
-                        'breadth': round(breadth, 1)
-                    })
+            movements = movements_mat[idx - 1]
+            sector_movements = sector_mat[idx - 1]
+            if processed[idx - 1] == 0:
+                print(f"   ⚠️  No market data for {trade_date}")
+            else:
+                print(f"   ✅ Successfully processed {processed[idx - 1]} stocks for {trade_date}")
             
             # Display summary
-            gainers = movements['up_15+'] + movements['up_10_15'] + movements['up_5_10'] + movements['up_3_5']
-            losers = movements['down_15+'] + movements['down_10_15'] + movements['down_5_10'] + movements['down_3_5']
+            gainers = int(movements[:4].sum())
+            losers = int(movements[4:8].sum())
             total_movers = gainers + losers
             breadth = (gainers / total_movers * 100) if total_movers > 0 else 50
             
             print(f"   📊 Gainers: {gainers} | Losers: {losers} | Breadth: {breadth:.1f}%")
             
             # Show top/bottom sectors
-            sector_breadth = [(s, (m['up_3+'] / m['total'] * 100)) 
-                            for s, m in sector_movements.items() if m['total'] >= 3]
-            sector_breadth.sort(key=lambda x: x[1], reverse=True)
-            
-            if len(sector_breadth) > 0:
-                top_sector = sector_breadth[0]
-                bottom_sector = sector_breadth[-1]
-                print(f"   🏆 Top: {top_sector[0]} ({top_sector[1]:.0f}%)")
-                print(f"   ⚠️  Bottom: {bottom_sector[0]} ({bottom_sector[1]:.0f}%)")
+            sector_totals = sector_movements.sum(axis=1)
+            sector_breadth = np.where(sector_totals >= 3,
+                                      sector_movements[:, 0] / np.maximum(sector_totals, 1) * 100, np.nan)
             
-            time.sleep(1)
+            if not np.isnan(sector_breadth).all():
+                top, bottom = np.nanargmax(sector_breadth), np.nanargmin(sector_breadth)
+                print(f"   🏆 Top: {sectors[top]} ({sector_breadth[top]:.0f}%)")
+                print(f"   ⚠️  Bottom: {sectors[bottom]} ({sector_breadth[bottom]:.0f}%)")
         
         # Save to CSV files
         print("\n" + "="*70)
         print("💾 Saving data...")
         
-        # Save overall movements
-        movements_df = pd.DataFrame(all_movements)
-        movements_df.to_csv(self.data_file, index=False)
-        print(f"✅ Overall movements saved to: {self.data_file}")
+        movements_df = pd.DataFrame(movements_mat, columns=self.MOVEMENT_COLUMNS)
+        movements_df.insert(0, 'date', trading_days)
         
-        # Save sector movements
-        sector_df = pd.DataFrame(all_sector_movements)
-        sector_df.to_csv(self.sector_file, index=False)
-        print(f"✅ Sector movements saved to: {self.sector_file}")
+        # Long format: one row per (day, sector) that had any stocks processed
+        counts = sector_mat.reshape(-1, 3)
+        totals = counts.sum(axis=1)
+        sector_df = pd.DataFrame({
+            'date': np.repeat(np.array(trading_days, dtype=object), len(sectors)),
+            'sector': np.tile(sectors, len(trading_days)),
+            'up_3_plus': counts[:, 0],
+            'down_3_plus': counts[:, 1],
+            'neutral': counts[:, 2],
+            'total': totals,
+            'breadth': np.round(counts[:, 0] / np.maximum(totals, 1) * 100, 1)
+        })[totals > 0].reset_index(drop=True)
+        self.save_history(movements_df, sector_df)
+        print(f"✅ Overall movements saved to: {self.data_file} (+ {self.parquet_file})")
+        print(f"✅ Sector movements saved to: {self.sector_file} (+ {self.sector_parquet_file})")
         
         print("\n" + "="*70)
         print("✅ BACKFILL COMPLETE!")
@@ -5,18 +5,37 @@ Real-time monitoring with Streamlit
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 import os
+import importlib.util
 from pathlib import Path
 
-# Import market intelligence module
+# Optional LTTB downsampling for long time-series charts
 try:
-    from market_intelligence import MarketIntelligence
-    ANALYTICS_AVAILABLE = True
+    from plotly_resampler import FigureResampler
+    RESAMPLER_AVAILABLE = True
+except ImportError:
+    RESAMPLER_AVAILABLE = False
+
+# Optional C moving-window kernels for the moving-average chart
+try:
+    import bottleneck as bn
+    BOTTLENECK_AVAILABLE = True
 except ImportError:
-    ANALYTICS_AVAILABLE = False
+    BOTTLENECK_AVAILABLE = False
+
+# Optional client-side auto-refresh timer
+try:
+    from streamlit_autorefresh import st_autorefresh
+    AUTOREFRESH_AVAILABLE = True
+except ImportError:
+    AUTOREFRESH_AVAILABLE = False
+
+# Market intelligence module (imported where it is used)
+ANALYTICS_AVAILABLE = importlib.util.find_spec('market_intelligence') is not None
+if not ANALYTICS_AVAILABLE:
     st.warning("⚠️ Analytics module not found. Some features will be limited.")
 
 # Page configuration
@@ -44,6 +63,127 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Movement columns summed into daily gainer/loser totals
+UP_COLS = ['up_3_5', 'up_5_10', 'up_10_15', 'up_15_plus']
+DOWN_COLS = ['down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus']
+
+# Column types of the history CSVs, applied while parsing; daily stock counts fit in
+# int16, breadth percentages in float32 and the few dozen sector names in a category
+MOVEMENT_DTYPES = {col: 'int16' for col in ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5',
+                                            'down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus', 'neutral']}
+SECTOR_DTYPES = {'sector': 'category', 'up_3_plus': 'int16', 'down_3_plus': 'int16',
+                 'neutral': 'int16', 'total': 'int16', 'breadth': 'float32'}
+
+def _read_history(csv_file, dtypes):
+    """Read a history file, preferring an up-to-date Parquet copy from the backfill scripts"""
+    # The daily trackers only update the CSV, so a Parquet copy older than it is stale
+    parquet_file = os.path.splitext(csv_file)[0] + '.parquet'
+    if os.path.exists(parquet_file) and os.path.getmtime(parquet_file) >= os.path.getmtime(csv_file):
+        df = pd.read_parquet(parquet_file)
+        # Month-partitioned datasets add their partition keys back as columns
+        return df.drop(columns=['year', 'month'], errors='ignore')
+    
+    # Typed parse with the Arrow reader; files with malformed values fall back to
+    # the default parser and get coerced by the loaders
+    columns = pd.read_csv(csv_file, nrows=0).columns
+    try:
+        return pd.read_csv(csv_file, engine='pyarrow',
+                           dtype={col: dtype for col, dtype in dtypes.items() if col in columns},
+                           parse_dates=['date'] if 'date' in columns else None)
+    except Exception:
+        return pd.read_csv(csv_file)
+
+def _history_mtime(csv_file):
+    """Latest modification time of a history file and its Parquet copy (cache key)"""
+    parquet_file = os.path.splitext(csv_file)[0] + '.parquet'
+    return max(os.path.getmtime(f) for f in (csv_file, parquet_file) if os.path.exists(f))
+
+# Parsed histories are cached across reruns and re-read only when the files change
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_movement_history(data_file, mtime):
+    """Parse and clean the movement history"""
+    df = _read_history(data_file, MOVEMENT_DTYPES)
+    
+    # Empty file
+    if df.empty or len(df.columns) == 0:
+        return None
+    
+    # Auto-fix: rename first column to 'date' if it contains date-like values
+    if 'date' not in df.columns:
+        first_col = df.columns[0]
+        try:
+            pd.to_datetime(df[first_col].iloc[0])
+            df = df.rename(columns={first_col: 'date'})
+        except:
+            return None
+    
+    # Required movement columns
+    required_cols = ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5',
+                   'down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus']
+    
+    # Fill any missing movement columns with 0
+    for col in required_cols:
+        if col not in df.columns:
+            df[col] = 0
+    
+    # Fill neutral if missing
+    if 'neutral' not in df.columns:
+        df['neutral'] = 0
+    
+    # Convert date column (already parsed unless the typed read fell back)
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    
+    # Drop rows where date conversion failed
+    df = df.dropna(subset=['date'])
+    
+    # Convert numeric columns that didn't come out of the reader as integers
+    for col in required_cols + ['neutral']:
+        if not pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df = df.astype(MOVEMENT_DTYPES)
+    
+    # Daily gainer/loser totals, computed once per file change and shared by the charts
+    df['_gainers'] = df[UP_COLS].sum(axis=1)
+    df['_losers'] = df[DOWN_COLS].sum(axis=1)
+    
+    # Sort by date
+    df = df.sort_values('date').reset_index(drop=True)
+    
+    return df if len(df) > 0 else None
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_sector_history(sector_file, mtime):
+    """Parse and clean the sector history"""
+    sector_df = _read_history(sector_file, SECTOR_DTYPES)
+    
+    if sector_df.empty or len(sector_df.columns) == 0:
+        return None
+    
+    # Auto-fix: rename first column to 'date' if needed
+    if 'date' not in sector_df.columns:
+        first_col = sector_df.columns[0]
+        try:
+            pd.to_datetime(sector_df[first_col].iloc[0])
+            sector_df = sector_df.rename(columns={first_col: 'date'})
+        except:
+            return None
+    
+    if not pd.api.types.is_datetime64_any_dtype(sector_df['date']):
+        sector_df['date'] = pd.to_datetime(sector_df['date'], errors='coerce')
+    sector_df = sector_df.dropna(subset=['date'])
+    
+    # Add missing numeric columns as 0, then coerce and type all of them as one block
+    numeric_cols = ['up_3_plus', 'down_3_plus', 'neutral', 'total', 'breadth']
+    sector_df = sector_df.reindex(columns=sector_df.columns.union(numeric_cols, sort=False), fill_value=0)
+    numeric = sector_df[numeric_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
+    sector_df = sector_df.assign(**numeric.astype({col: SECTOR_DTYPES[col] for col in numeric_cols}))
+    sector_df['sector'] = sector_df['sector'].astype('category')
+    
+    sector_df = sector_df.sort_values('date').reset_index(drop=True)
+    
+    return sector_df if len(sector_df) > 0 else None
+
 class DashboardData:
     def __init__(self, data_file='stock_movements_history.csv', sector_file='sector_movements_history.csv'):
         self.data_file = data_file
@@ -57,48 +197,7 @@ class DashboardData:
             return None
         
         try:
-            df = pd.read_csv(self.data_file)
-            
-            # Empty file
-            if df.empty or len(df.columns) == 0:
-                return None
-            
-            # Auto-fix: rename first column to 'date' if it contains date-like values
-            if 'date' not in df.columns:
-                first_col = df.columns[0]
-                try:
-                    pd.to_datetime(df[first_col].iloc[0])
-                    df = df.rename(columns={first_col: 'date'})
-                except:
-                    return None
-            
-            # Required movement columns
-            required_cols = ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5',
-                           'down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus']
-            
-            # Fill any missing movement columns with 0
-            for col in required_cols:
-                if col not in df.columns:
-                    df[col] = 0
-            
-            # Fill neutral if missing
-            if 'neutral' not in df.columns:
-                df['neutral'] = 0
-            
-            # Convert date column
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            
-            # Drop rows where date conversion failed
-            df = df.dropna(subset=['date'])
-            
-            # Convert numeric columns
-            for col in required_cols + ['neutral']:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
-            
-            # Sort by date
-            df = df.sort_values('date').reset_index(drop=True)
-            
-            return df if len(df) > 0 else None
+            return _load_movement_history(self.data_file, _history_mtime(self.data_file))
             
         except Exception as e:
             st.error(f"❌ Error loading data: {e}")
@@ -111,36 +210,16 @@ class DashboardData:
             return None
         
         try:
-            sector_df = pd.read_csv(self.sector_file)
-            
-            if sector_df.empty or len(sector_df.columns) == 0:
-                return None
-            
-            # Auto-fix: rename first column to 'date' if needed
-            if 'date' not in sector_df.columns:
-                first_col = sector_df.columns[0]
-                try:
-                    pd.to_datetime(sector_df[first_col].iloc[0])
-                    sector_df = sector_df.rename(columns={first_col: 'date'})
-                except:
-                    return None
-            
-            sector_df['date'] = pd.to_datetime(sector_df['date'], errors='coerce')
-            sector_df = sector_df.dropna(subset=['date'])
-            
-            # Fill missing numeric columns with 0
-            for col in ['up_3_plus', 'down_3_plus', 'neutral', 'total', 'breadth']:
-                if col not in sector_df.columns:
-                    sector_df[col] = 0
-                sector_df[col] = pd.to_numeric(sector_df[col], errors='coerce').fillna(0)
-            
-            sector_df = sector_df.sort_values('date').reset_index(drop=True)
-            
-            return sector_df if len(sector_df) > 0 else None
+            return _load_sector_history(self.sector_file, _history_mtime(self.sector_file))
             
         except Exception as e:
             return None
     
+    def history_mtimes(self):
+        """Modification times of the movement and sector histories (None if missing)"""
+        return tuple(_history_mtime(f) if os.path.exists(f) else None
+                     for f in (self.data_file, self.sector_file))
+    
     def get_latest_stats(self, df):
         """Get latest day statistics"""
         if df is None or len(df) == 0:
@@ -148,8 +227,9 @@ class DashboardData:
         
         latest = df.iloc[-1]
         
-        gainers = latest['up_3_5'] + latest['up_5_10'] + latest['up_10_15'] + latest['up_15_plus']
-        losers = latest['down_3_5'] + latest['down_5_10'] + latest['down_10_15'] + latest['down_15_plus']
+        counts = df[UP_COLS + DOWN_COLS].iloc[-1].to_numpy()
+        gainers = counts[:4].sum()
+        losers = counts[4:].sum()
         total_movers = gainers + losers
         
         return {
@@ -168,12 +248,11 @@ class DashboardData:
         if df is None or len(df) < days:
             return None
         
-        recent = df.tail(days)
+        # (days x 8) counts: gainer columns first, then loser columns
+        recent = df[UP_COLS + DOWN_COLS].iloc[-days:].to_numpy()
         
-        gainers = (recent['up_3_5'] + recent['up_5_10'] + 
-                  recent['up_10_15'] + recent['up_15_plus']).mean()
-        losers = (recent['down_3_5'] + recent['down_5_10'] + 
-                 recent['down_10_15'] + recent['down_15_plus']).mean()
+        gainers = recent[:, :4].sum(axis=1).mean()
+        losers = recent[:, 4:].sum(axis=1).mean()
         
         return {
             'avg_gainers': gainers,
@@ -181,32 +260,39 @@ class DashboardData:
             'trend': 'Bullish' if gainers > losers * 1.2 else 'Bearish' if losers > gainers * 1.2 else 'Neutral'
         }
 
+# The chart builders below are cached on their arguments (Streamlit hashes DataFrame
+# contents), so reruns with unchanged data reuse the built figures
+
+def create_line_figure(traces, layout):
+    """Figure for long time series, LTTB-downsampled to 2000 points per trace when plotly-resampler is installed"""
+    fig = go.Figure(data=traces, layout=layout)
+    if RESAMPLER_AVAILABLE:
+        return FigureResampler(fig, default_n_shown_samples=2000)
+    return fig
+
+@st.cache_data(show_spinner=False)
 def create_market_breadth_chart(df):
-    """Create interactive market breadth chart"""
-    gainers = df['up_3_5'] + df['up_5_10'] + df['up_10_15'] + df['up_15_plus']
-    losers = df['down_3_5'] + df['down_5_10'] + df['down_10_15'] + df['down_15_plus']
-    
-    fig = go.Figure()
-    
-    fig.add_trace(go.Scatter(
-        x=df['date'], y=gainers,
-        name='Gainers (3%+)',
-        mode='lines+markers',
-        line=dict(color='green', width=3),
-        fill='tozeroy',
-        fillcolor='rgba(0, 255, 0, 0.2)'
-    ))
-    
-    fig.add_trace(go.Scatter(
-        x=df['date'], y=losers,
-        name='Losers (3%+)',
-        mode='lines+markers',
-        line=dict(color='red', width=3),
-        fill='tozeroy',
-        fillcolor='rgba(255, 0, 0, 0.2)'
-    ))
+    """Create interactive market breadth chart (expects the _gainers/_losers columns from the loader)"""
+    traces = [
+        go.Scattergl(
+            x=df['date'], y=df['_gainers'],
+            name='Gainers (3%+)',
+            mode='lines+markers',
+            line=dict(color='green', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(0, 255, 0, 0.2)'
+        ),
+        go.Scattergl(
+            x=df['date'], y=df['_losers'],
+            name='Losers (3%+)',
+            mode='lines+markers',
+            line=dict(color='red', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(255, 0, 0, 0.2)'
+        )
+    ]
     
-    fig.update_layout(
+    layout = go.Layout(
         title='Market Breadth: Gainers vs Losers Over Time',
         xaxis_title='Date',
         yaxis_title='Number of Stocks',
@@ -215,27 +301,27 @@ def create_market_breadth_chart(df):
         height=400
     )
     
-    return fig
+    return create_line_figure(traces, layout)
 
+@st.cache_data(show_spinner=False)
 def create_extreme_movements_chart(df):
     """Create extreme movements chart"""
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
-        x=df['date'], 
-        y=df['up_15_plus'],
-        name='Up 15%+',
-        marker_color='darkgreen'
-    ))
-    
-    fig.add_trace(go.Bar(
-        x=df['date'], 
-        y=-df['down_15_plus'],
-        name='Down 15%+',
-        marker_color='darkred'
-    ))
+    traces = [
+        go.Bar(
+            x=df['date'], 
+            y=df['up_15_plus'],
+            name='Up 15%+',
+            marker_color='darkgreen'
+        ),
+        go.Bar(
+            x=df['date'], 
+            y=-df['down_15_plus'],
+            name='Down 15%+',
+            marker_color='darkred'
+        )
+    ]
     
-    fig.update_layout(
+    layout = go.Layout(
         title='Extreme Movements (±15%)',
         xaxis_title='Date',
         yaxis_title='Number of Stocks',
@@ -244,8 +330,9 @@ def create_extreme_movements_chart(df):
         barmode='relative'
     )
     
-    return fig
+    return go.Figure(data=traces, layout=layout)
 
+@st.cache_data(show_spinner=False)
 def create_volatility_gauge(total_movers, avg_movers):
     """Create volatility gauge"""
     volatility_pct = (total_movers / avg_movers * 100) if avg_movers > 0 else 100
@@ -274,38 +361,36 @@ def create_volatility_gauge(total_movers, avg_movers):
     fig.update_layout(height=300)
     return fig
 
+@st.cache_data(show_spinner=False)
 def create_advance_decline_chart(df):
-    """Create cumulative advance-decline line"""
-    gainers = df['up_3_5'] + df['up_5_10'] + df['up_10_15'] + df['up_15_plus']
-    losers = df['down_3_5'] + df['down_5_10'] + df['down_10_15'] + df['down_15_plus']
-    
-    daily_diff = gainers - losers
+    """Create cumulative advance-decline line (expects the _gainers/_losers columns from the loader)"""
+    daily_diff = df['_gainers'] - df['_losers']
     cumulative = daily_diff.cumsum()
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Scatter(
-        x=df['date'],
-        y=cumulative,
-        mode='lines',
-        name='A/D Line',
-        line=dict(color='blue', width=3),
-        fill='tozeroy',
-        fillcolor='rgba(0, 0, 255, 0.1)'
-    ))
+    fig = create_line_figure(
+        [go.Scattergl(
+            x=df['date'],
+            y=cumulative,
+            mode='lines',
+            name='A/D Line',
+            line=dict(color='blue', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(0, 0, 255, 0.1)'
+        )],
+        go.Layout(
+            title='Cumulative Advance-Decline Line',
+            xaxis_title='Date',
+            yaxis_title='Cumulative Difference',
+            hovermode='x unified',
+            height=400
+        )
+    )
     
     fig.add_hline(y=0, line_dash="dash", line_color="black", opacity=0.5)
     
-    fig.update_layout(
-        title='Cumulative Advance-Decline Line',
-        xaxis_title='Date',
-        yaxis_title='Cumulative Difference',
-        hovermode='x unified',
-        height=400
-    )
-    
     return fig
 
+@st.cache_data(show_spinner=False)
 def create_distribution_pie(latest_data):
     """Create distribution pie chart for latest day (excluding neutral)"""
     categories = {
@@ -338,6 +423,7 @@ def create_distribution_pie(latest_data):
     
     return fig
 
+@st.cache_data(show_spinner=False)
 def create_heatmap(df):
     """Create category heatmap with RAG color scheme (excluding neutral)"""
     categories = ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5', 
@@ -346,7 +432,8 @@ def create_heatmap(df):
     labels = ['↑15%+', '↑10-15%', '↑5-10%', '↑3-5%', 
              '↓3-5%', '↓5-10%', '↓10-15%', '↓15%+']
     
-    heatmap_data = df[categories].T.values
+    # (categories x dates); transposing the (dates x categories) array is a view, not a copy
+    heatmap_data = df.loc[:, categories].to_numpy(copy=False).T
     
     # Custom RAG colorscale for 8 categories (no neutral)
     custom_colorscale = [
@@ -381,18 +468,19 @@ def create_heatmap(df):
     
     return fig
 
+@st.cache_data(show_spinner=False)
+def _sector_pivot(sector_df):
+    """Sectors as rows, dates as columns, breadth as values; sorted by average breadth"""
+    pivot_data = sector_df.pivot(index='sector', columns='date', values='breadth')
+    return pivot_data.loc[pivot_data.mean(axis=1).sort_values(ascending=False).index]
+
+@st.cache_data(show_spinner=False)
 def create_sector_heatmap(sector_df):
     """Create sector performance heatmap"""
     if sector_df is None or len(sector_df) == 0:
         return None
     
-    # Pivot data: sectors as rows, dates as columns, breadth as values
-    pivot_data = sector_df.pivot(index='sector', columns='date', values='breadth')
-    
-    # Sort sectors by average breadth
-    pivot_data['avg'] = pivot_data.mean(axis=1)
-    pivot_data = pivot_data.sort_values('avg', ascending=False)
-    pivot_data = pivot_data.drop('avg', axis=1)
+    pivot_data = _sector_pivot(sector_df)
     
     # Custom colorscale for breadth (0-100%)
     breadth_colorscale = [
@@ -409,7 +497,7 @@ def create_sector_heatmap(sector_df):
     
     fig = go.Figure(data=go.Heatmap(
         z=pivot_data.values,
-        x=[d.strftime('%Y-%m-%d') for d in pivot_data.columns],
+        x=pivot_data.columns.strftime('%Y-%m-%d'),
         y=pivot_data.index,
         colorscale=breadth_colorscale,
         zmid=50,  # Center at 50% breadth
@@ -439,13 +527,18 @@ def get_sector_momentum_emoji(breadth):
     else:
         return '🔴'
 
+def sector_momentum_emojis(breadth):
+    """Vectorized get_sector_momentum_emoji for an array of breadth percentages"""
+    return np.select([breadth >= 70, breadth >= 55], ['🟢', '🟡'], default='🔴')
+
+@st.cache_data(show_spinner=False)
 def create_sector_insights(sector_df):
     """Create sector rotation and momentum insights"""
     if sector_df is None or len(sector_df) == 0:
         return None
     
-    # Get unique dates sorted
-    dates = sorted(sector_df['date'].unique())
+    # Get unique dates sorted (datetime64 array, sorted without boxing to Timestamps)
+    dates = sector_df['date'].drop_duplicates().sort_values().to_numpy()
     
     if len(dates) < 2:
         return None
@@ -455,27 +548,27 @@ def create_sector_insights(sector_df):
         'rotations': []
     }
     
-    # Get all sectors
-    sectors = sector_df['sector'].unique()
-    
-    # Momentum patterns (last 7 days if available)
-    recent_dates = dates[-7:] if len(dates) >= 7 else dates
-    
-    for sector in sectors:
-        sector_data = sector_df[sector_df['sector'] == sector]
-        sector_data = sector_data[sector_data['date'].isin(recent_dates)]
-        sector_data = sector_data.sort_values('date')
-        
-        if len(sector_data) >= 3:
-            pattern = ''.join([get_sector_momentum_emoji(b) for b in sector_data['breadth'].values])
-            avg_breadth = sector_data['breadth'].mean()
-            
-            insights['momentum_patterns'].append({
-                'sector': sector,
-                'pattern': pattern,
-                'avg_breadth': avg_breadth,
-                'days': len(sector_data)
-            })
+    # Get all sectors (results keep this order among equal rankings)
+    sectors = pd.Index(sector_df['sector'].unique())
+    
+    # Momentum patterns (last 7 days if available), aggregated for all sectors in one groupby
+    recent_dates = pd.DatetimeIndex(dates[-7:] if len(dates) >= 7 else dates)
+    recent = sector_df[sector_df['date'].isin(recent_dates)].sort_values(['sector', 'date'])
+    recent = recent.assign(emoji=sector_momentum_emojis(recent['breadth'].to_numpy()))
+    grouped = recent.groupby('sector', sort=False, observed=True)['breadth']
+    momentum = pd.DataFrame({
+        'pattern': recent.groupby('sector', sort=False, observed=True)['emoji'].agg(''.join),
+        'avg_breadth': grouped.mean(),
+        'days': grouped.size()
+    })
+    momentum = momentum[momentum['days'] >= 3]
+    momentum = momentum.loc[sectors[sectors.isin(momentum.index)]]
+    
+    insights['momentum_patterns'] = [
+        {'sector': sector, 'pattern': pattern, 'avg_breadth': avg_breadth, 'days': days}
+        for sector, pattern, avg_breadth, days in zip(momentum.index, momentum['pattern'],
+                                                       momentum['avg_breadth'], momentum['days'])
+    ]
     
     # Sort by average breadth
     insights['momentum_patterns'].sort(key=lambda x: x['avg_breadth'], reverse=True)
@@ -486,31 +579,62 @@ def create_sector_insights(sector_df):
         week1_dates = dates[mid_point-5:mid_point]
         week2_dates = dates[mid_point:]
         
-        for sector in sectors:
-            sector_data = sector_df[sector_df['sector'] == sector]
-            
-            week1_data = sector_data[sector_data['date'].isin(week1_dates)]
-            week2_data = sector_data[sector_data['date'].isin(week2_dates)]
-            
-            if len(week1_data) >= 3 and len(week2_data) >= 3:
-                week1_avg = week1_data['breadth'].mean()
-                week2_avg = week2_data['breadth'].mean()
-                change = week2_avg - week1_avg
-                
-                insights['rotations'].append({
-                    'sector': sector,
-                    'week1_avg': week1_avg,
-                    'week2_avg': week2_avg,
-                    'change': change,
-                    'week1_emoji': get_sector_momentum_emoji(week1_avg),
-                    'week2_emoji': get_sector_momentum_emoji(week2_avg)
-                })
+        # Both weekly averages (and row counts) for every sector from a single groupby
+        week = np.where(sector_df['date'].isin(week2_dates), 2,
+                        np.where(sector_df['date'].isin(week1_dates), 1, 0))
+        weekly = (sector_df.assign(week=week).query('week > 0')
+                  .groupby(['sector', 'week'], observed=True)['breadth'].agg(['mean', 'size'])
+                  .unstack('week'))
+        weekly = weekly[(weekly[('size', 1)] >= 3) & (weekly[('size', 2)] >= 3)]
+        weekly = weekly.loc[sectors[sectors.isin(weekly.index)]]
+        change = weekly[('mean', 2)] - weekly[('mean', 1)]
+        
+        insights['rotations'] = [
+            {
+                'sector': sector,
+                'week1_avg': week1_avg,
+                'week2_avg': week2_avg,
+                'change': sector_change,
+                'week1_emoji': get_sector_momentum_emoji(week1_avg),
+                'week2_emoji': get_sector_momentum_emoji(week2_avg)
+            }
+            for sector, week1_avg, week2_avg, sector_change in zip(weekly.index, weekly[('mean', 1)],
+                                                                   weekly[('mean', 2)], change)
+        ]
         
         # Sort by biggest changes
         insights['rotations'].sort(key=lambda x: abs(x['change']), reverse=True)
     
     return insights
 
+# MarketIntelligence results are cached on the history files' modification times (the
+# same keys as the loaders, so a same-day rewrite of today's row invalidates them too);
+# the underscore-prefixed frame arguments are not hashed by Streamlit
+@st.cache_data(ttl=300, max_entries=8, show_spinner=False)
+def cached_sector_signals(_df, _sector_df, data_mtime, sector_mtime):
+    """MarketIntelligence.generate_sector_signals, computed once per data update"""
+    from market_intelligence import MarketIntelligence
+    return MarketIntelligence(_df, _sector_df).generate_sector_signals()
+
+@st.cache_data(ttl=300, max_entries=8, show_spinner=False)
+def cached_risk_metrics(_df, _sector_df, data_mtime, sector_mtime):
+    """MarketIntelligence.calculate_risk_metrics, computed once per data update"""
+    from market_intelligence import MarketIntelligence
+    return MarketIntelligence(_df, _sector_df).calculate_risk_metrics()
+
+def moving_average(series, window=5):
+    """Trailing moving average, NaN until the window fills (like rolling(window).mean())"""
+    if BOTTLENECK_AVAILABLE:
+        return bn.move_mean(series.to_numpy(dtype=np.float64), window=window)
+    return series.rolling(window).mean().to_numpy()
+
+def slice_date_range(df, date_range):
+    """Rows of a date-sorted frame between two dates (inclusive), found by binary search"""
+    start = np.datetime64(date_range[0])
+    end = np.datetime64(date_range[1]) + np.timedelta64(1, 'D')
+    lo, hi = np.searchsorted(df['date'].to_numpy(), [start, end])
+    return df.iloc[lo:hi]
+
 def main():
     # Header
     st.title("📊 Indian Stock Movement Dashboard")
@@ -548,17 +672,29 @@ def main():
         max_value=max_date
     )
     
-    # Filter data by date range
+    # Filter data by date range (a read-only slice; nothing below writes to it)
     if len(date_range) == 2:
-        mask = (df['date'].dt.date >= date_range[0]) & (df['date'].dt.date <= date_range[1])
-        df_filtered = df[mask].copy()
+        df_filtered = slice_date_range(df, date_range)
     else:
-        df_filtered = df.copy()
+        df_filtered = df
     
     # Get statistics
     latest_stats = data_loader.get_latest_stats(df)
     trend_stats = data_loader.get_trend_stats(df)
     
+    # Market intelligence over the loaded data, rebuilt only when the data changes
+    # and otherwise reused across this session's reruns
+    intel = None
+    if ANALYTICS_AVAILABLE and len(df) >= 5:
+        # Keyed on the files' modification times: a same-day re-run rewrites today's
+        # row without changing the row count or latest date
+        intel_key = data_loader.history_mtimes()
+        if st.session_state.get('intel_key') != intel_key:
+            from market_intelligence import MarketIntelligence
+            st.session_state['intel'] = MarketIntelligence(df, sector_df)
+            st.session_state['intel_key'] = intel_key
+        intel = st.session_state['intel']
+    
     # Display last update time
     st.sidebar.markdown("---")
     st.sidebar.info(f"📅 **Latest Data:** {latest_stats['date'].strftime('%Y-%m-%d')}")
@@ -568,9 +704,13 @@ def main():
     st.sidebar.markdown("---")
     auto_refresh = st.sidebar.checkbox("🔄 Auto-refresh (30s)")
     if auto_refresh:
-        import time
-        time.sleep(30)
-        st.rerun()
+        if AUTOREFRESH_AVAILABLE:
+            # The browser schedules the rerun, so this script run isn't held open
+            st_autorefresh(interval=30_000, key='auto_refresh')
+        else:
+            import time
+            time.sleep(30)
+            st.rerun()
     
     # Main dashboard layout
     st.markdown("---")
@@ -636,12 +776,10 @@ def main():
     st.markdown(f"### Market Sentiment: {sentiment}")
     
     # Market Intelligence Section
-    if ANALYTICS_AVAILABLE and len(df) >= 5:
+    if intel is not None:
         st.markdown("---")
         st.subheader("🎯 Market Intelligence Center")
         
-        intel = MarketIntelligence(df, sector_df)
-        
         # Market Score
         market_score = intel.calculate_market_score()
         if market_score:
@@ -745,15 +883,13 @@ def main():
                 st.metric("5-Day Trend", f"{trend_color} {trend_stats['trend']}")
         
         # Moving average trends
-        gainers_series = df_filtered['up_3_5'] + df_filtered['up_5_10'] + df_filtered['up_10_15'] + df_filtered['up_15_plus']
-        losers_series = df_filtered['down_3_5'] + df_filtered['down_5_10'] + df_filtered['down_10_15'] + df_filtered['down_15_plus']
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df_filtered['date'], y=gainers_series.rolling(5).mean(), 
-                                name='Gainers (5-day MA)', line=dict(color='green', width=3)))
-        fig.add_trace(go.Scatter(x=df_filtered['date'], y=losers_series.rolling(5).mean(), 
-                                name='Losers (5-day MA)', line=dict(color='red', width=3)))
-        fig.update_layout(title='5-Day Moving Average: Gainers vs Losers', height=400)
+        fig = create_line_figure(
+            [go.Scattergl(x=df_filtered['date'], y=moving_average(df_filtered['_gainers']),
+                          name='Gainers (5-day MA)', line=dict(color='green', width=3)),
+             go.Scattergl(x=df_filtered['date'], y=moving_average(df_filtered['_losers']),
+                          name='Losers (5-day MA)', line=dict(color='red', width=3))],
+            go.Layout(title='5-Day Moving Average: Gainers vs Losers', height=400)
+        )
         st.plotly_chart(fig, use_container_width=True, key="ma_trends")
     
     with tab3:
@@ -762,10 +898,9 @@ def main():
         if sector_df is not None and len(sector_df) > 0:
             # Filter sector data by date range
             if len(date_range) == 2:
-                mask = (sector_df['date'].dt.date >= date_range[0]) & (sector_df['date'].dt.date <= date_range[1])
-                sector_df_filtered = sector_df[mask].copy()
+                sector_df_filtered = slice_date_range(sector_df, date_range)
             else:
-                sector_df_filtered = sector_df.copy()
+                sector_df_filtered = sector_df
             
             if len(sector_df_filtered) > 0:
                 # Sector Performance Heatmap
@@ -804,16 +939,16 @@ def main():
                         st.markdown("**Week 1 vs Week 2 Comparison (Last 10 Days)**")
                         
                         # Show biggest rotations
-                        rotation_data = []
-                        for rot in insights['rotations'][:15]:
-                            direction = "📈" if rot['change'] > 0 else "📉"
-                            rotation_data.append({
+                        rotation_data = [
+                            {
                                 'Sector': rot['sector'],
                                 'Week 1': f"{rot['week1_emoji']} {rot['week1_avg']:.0f}%",
                                 'Week 2': f"{rot['week2_emoji']} {rot['week2_avg']:.0f}%",
-                                'Change': f"{direction} {rot['change']:+.1f}%",
+                                'Change': f"{'📈' if rot['change'] > 0 else '📉'} {rot['change']:+.1f}%",
                                 'Status': '🔥 Strong' if abs(rot['change']) > 20 else '➡️ Moderate' if abs(rot['change']) > 10 else '💤 Stable'
-                            })
+                            }
+                            for rot in insights['rotations'][:15]
+                        ]
                         
                         rotation_df = pd.DataFrame(rotation_data)
                         st.dataframe(rotation_df, use_container_width=True, hide_index=True)
@@ -837,7 +972,7 @@ def main():
                         
                         with col3:
                             # Count rotations (significant changes)
-                            significant = len([r for r in insights['rotations'] if abs(r['change']) > 15])
+                            significant = sum(1 for r in insights['rotations'] if abs(r['change']) > 15)
                             st.metric("🔄 Active Rotations",
                                      f"{significant}",
                                      "Sectors with 15%+ change")
@@ -944,26 +1079,24 @@ def main():
             st.markdown("---")
             st.subheader("📅 Weekly Pattern Analysis")
             
-            df_filtered['day_of_week'] = df_filtered['date'].dt.day_name()
-            gainers = df_filtered['up_3_5'] + df_filtered['up_5_10'] + df_filtered['up_10_15'] + df_filtered['up_15_plus']
-            losers = df_filtered['down_3_5'] + df_filtered['down_5_10'] + df_filtered['down_10_15'] + df_filtered['down_15_plus']
-            
+            # Group on the integer weekday (Monday=0) and label the five trading days afterwards
             weekly_data = pd.DataFrame({
-                'Day': df_filtered['day_of_week'],
-                'Gainers': gainers,
-                'Losers': losers
+                'Gainers': df_filtered['_gainers'],
+                'Losers': df_filtered['_losers']
             })
             
             day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-            weekly_avg = weekly_data.groupby('Day').mean().reindex(day_order).reset_index()
+            weekly_avg = weekly_data.groupby(df_filtered['date'].dt.dayofweek.to_numpy()).mean().reindex(range(5))
+            weekly_avg.insert(0, 'Day', day_order)
             
-            fig = go.Figure()
-            fig.add_trace(go.Bar(x=weekly_avg['Day'], y=weekly_avg['Gainers'], 
-                                name='Avg Gainers', marker_color='green'))
-            fig.add_trace(go.Bar(x=weekly_avg['Day'], y=weekly_avg['Losers'], 
-                                name='Avg Losers', marker_color='red'))
-            fig.update_layout(title='Average Gainers/Losers by Day of Week', 
-                            barmode='group', height=400)
+            fig = go.Figure(
+                data=[go.Bar(x=weekly_avg['Day'], y=weekly_avg['Gainers'], 
+                             name='Avg Gainers', marker_color='green'),
+                      go.Bar(x=weekly_avg['Day'], y=weekly_avg['Losers'], 
+                             name='Avg Losers', marker_color='red')],
+                layout=go.Layout(title='Average Gainers/Losers by Day of Week', 
+                                 barmode='group', height=400)
+            )
             st.plotly_chart(fig, use_container_width=True, key="weekly_distribution")
             
             st.info("""
@@ -978,8 +1111,8 @@ def main():
         st.subheader("🎯 Actionable Sector Signals")
         
         if ANALYTICS_AVAILABLE and sector_df is not None and len(sector_df) >= 5:
-            intel = MarketIntelligence(df, sector_df)
-            signals = intel.generate_sector_signals()
+            history_mtimes = data_loader.history_mtimes()
+            signals = cached_sector_signals(df, sector_df, *history_mtimes)
             
             if signals:
                 col1, col2 = st.columns(2)
@@ -1048,22 +1181,19 @@ def main():
                                 st.markdown("**📊 Sample Stocks:**")
                             
                             # Display in a nice table format
-                            stock_data = []
-                            for stock in signal['top_stocks']:
-                                stock_data.append({
-                                    'Stock': stock['symbol'],
-                                    'Change': f"{stock['change_pct']:+.2f}%",
-                                    'Signal': '🟢 Buy' if stock['change_pct'] > 5 else '🔴 Sell' if stock['change_pct'] < -5 else '🟡 Hold'
-                                })
-                            
-                            if stock_data:
-                                st.table(pd.DataFrame(stock_data))
+                            changes = np.array([stock['change_pct'] for stock in signal['top_stocks']])
+                            stock_data = pd.DataFrame({
+                                'Stock': [stock['symbol'] for stock in signal['top_stocks']],
+                                'Change': [f"{change:+.2f}%" for change in changes],
+                                'Signal': np.select([changes > 5, changes < -5], ['🟢 Buy', '🔴 Sell'], default='🟡 Hold')
+                            })
+                            st.table(stock_data)
                 
                 # Risk Metrics
                 st.markdown("---")
                 st.subheader("⚠️ Risk Analysis")
                 
-                risk_metrics = intel.calculate_risk_metrics()
+                risk_metrics = cached_risk_metrics(df, sector_df, *history_mtimes)
                 if risk_metrics:
                     col1, col2, col3 = st.columns(3)
                     
@@ -1096,7 +1226,8 @@ def main():
     
     # Data table (expandable)
     with st.expander("📋 View Raw Data"):
-        st.dataframe(df_filtered.sort_values('date', ascending=False), use_container_width=True)
+        st.dataframe(df_filtered.drop(columns=['_gainers', '_losers']).sort_values('date', ascending=False),
+                     use_container_width=True)
     
     # Footer
     st.markdown("---")
@@ -5,36 +5,83 @@ Adds descriptive, predictive, and prescriptive analytics
 
 import pandas as pd
 import numpy as np
-from scipy.stats import percentileofscore
 from datetime import datetime, timedelta
+from functools import cached_property, lru_cache
+import glob
+import os
+
+UP_COLS = ['up_3_5', 'up_5_10', 'up_10_15', 'up_15_plus']
+DOWN_COLS = ['down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus']
+
+# Stock details columns used by the sector signals (symbols are unique, so they stay strings)
+STOCK_DETAIL_COLS = ['symbol', 'sector', 'change_pct']
+STOCK_DETAIL_DTYPES = {'sector': 'category', 'change_pct': 'float64'}
+
+@lru_cache(maxsize=1)
+def _latest_stock_details_file(dir_mtime):
+    """Newest stock_details_*.csv (cached until files are added to or removed from the directory)"""
+    stock_files = glob.glob('stock_details_*.csv')
+    return max(stock_files) if stock_files else None
+
+@lru_cache(maxsize=4)
+def _read_stock_details(path, mtime):
+    """Parse a stock details file (cached until the file changes)"""
+    return pd.read_csv(path, usecols=lambda col: col in STOCK_DETAIL_COLS, dtype=STOCK_DETAIL_DTYPES)
+
+def load_latest_stock_details():
+    """Most recent stock_details_*.csv as a DataFrame, or None"""
+    latest_file = _latest_stock_details_file(os.path.getmtime('.'))
+    if latest_file is None:
+        return None
+    try:
+        return _read_stock_details(latest_file, os.path.getmtime(latest_file))
+    except:
+        return None
 
 class MarketIntelligence:
     def __init__(self, movements_df, sector_df=None):
         self.movements_df = movements_df
         self.sector_df = sector_df
-        
+    
+    @cached_property
+    def _breadths(self):
+        """Daily breadth (% gainers among movers, 50 on days with no movers)"""
+        # Computed on first use in a single columnar pass and shared by every metric;
+        # the counts are small (int16 in the loaded history), so int32 sums and
+        # float32 percentages are exact enough and half the width of the defaults
+        gainers = self.movements_df[UP_COLS].to_numpy().sum(axis=1, dtype=np.int32)
+        losers = self.movements_df[DOWN_COLS].to_numpy().sum(axis=1, dtype=np.int32)
+        total_movers = gainers + losers
+        return np.divide(gainers * 100, total_movers, dtype=np.float32,
+                         out=np.full(len(total_movers), 50.0, dtype=np.float32),
+                         where=total_movers > 0)
+    
+    @cached_property
+    def _sorted_breadths(self):
+        """Sorted daily breadths, for percentile ranks by binary search"""
+        return np.sort(self._breadths)
+    
+    @cached_property
+    def _latest_sector_breadths(self):
+        """Breadths of every sector on the latest sector date"""
+        dates = self.sector_df['date'].to_numpy()
+        breadths = self.sector_df['breadth'].to_numpy()
+        if self.sector_df['date'].is_monotonic_increasing:
+            # The latest day is the trailing block of a date-sorted history
+            return breadths[np.searchsorted(dates, dates[-1]):]
+        return breadths[dates == dates.max()]
+    
     def calculate_market_score(self):
         """Calculate overall market health score (0-100)"""
         if len(self.movements_df) < 5:
             return None
         
-        latest = self.movements_df.iloc[-1]
-        
         # Calculate breadth
-        gainers = latest['up_3_5'] + latest['up_5_10'] + latest['up_10_15'] + latest['up_15_plus']
-        losers = latest['down_3_5'] + latest['down_5_10'] + latest['down_10_15'] + latest['down_15_plus']
-        total_movers = gainers + losers
-        breadth = (gainers / total_movers * 100) if total_movers > 0 else 50
+        breadth = self._breadths[-1]
         
         # Calculate momentum (5-day trend)
         if len(self.movements_df) >= 5:
-            recent = self.movements_df.tail(5)
-            recent_breadths = []
-            for _, row in recent.iterrows():
-                g = row['up_3_5'] + row['up_5_10'] + row['up_10_15'] + row['up_15_plus']
-                l = row['down_3_5'] + row['down_5_10'] + row['down_10_15'] + row['down_15_plus']
-                tm = g + l
-                recent_breadths.append((g / tm * 100) if tm > 0 else 50)
+            recent_breadths = self._breadths[-5:]
             
             momentum_score = (recent_breadths[-1] - recent_breadths[0]) / 50 * 100
             momentum_score = max(0, min(100, 50 + momentum_score))
@@ -43,14 +90,7 @@ class MarketIntelligence:
         
         # Calculate volatility score (lower volatility = higher score)
         if len(self.movements_df) >= 10:
-            all_breadths = []
-            for _, row in self.movements_df.tail(10).iterrows():
-                g = row['up_3_5'] + row['up_5_10'] + row['up_10_15'] + row['up_15_plus']
-                l = row['down_3_5'] + row['down_5_10'] + row['down_10_15'] + row['down_15_plus']
-                tm = g + l
-                all_breadths.append((g / tm * 100) if tm > 0 else 50)
-            
-            volatility = np.std(all_breadths)
+            volatility = np.std(self._breadths[-10:])
             volatility_score = max(0, 100 - (volatility * 2))
         else:
             volatility_score = 50
@@ -88,36 +128,36 @@ class MarketIntelligence:
             return None
         
         signals = []
-        sectors = self.sector_df['sector'].unique()
+        sectors = pd.Index(self.sector_df['sector'].unique())
         
         # Try to load latest stock details
-        from datetime import datetime
-        import glob
-        import os
-        
-        # Find most recent stock details file
-        stock_files = glob.glob('stock_details_*.csv')
-        latest_stocks = None
-        if stock_files:
-            latest_file = max(stock_files)
-            try:
-                latest_stocks = pd.read_csv(latest_file)
-            except:
-                latest_stocks = None
-        
-        for sector in sectors:
-            sector_data = self.sector_df[self.sector_df['sector'] == sector].tail(10)
-            
-            if len(sector_data) < 5:
-                continue
-            
-            # Calculate metrics
-            latest_breadth = sector_data.iloc[-1]['breadth']
-            avg_breadth = sector_data['breadth'].mean()
-            trend = sector_data['breadth'].diff().tail(5).mean()
-            
+        latest_stocks = load_latest_stock_details()
+        
+        # Best and worst (symbol, change_pct) pairs of each sector
+        stocks_by_sector = {}
+        if latest_stocks is not None and 'sector' in latest_stocks.columns:
+            for name, sub in latest_stocks.groupby('sector', sort=False, observed=True):
+                stocks_by_sector[name] = self._top_and_bottom_stocks(sub['symbol'].to_numpy(),
+                                                                     sub['change_pct'].to_numpy())
+        
+        # Last 7 days of every sector (the momentum pattern window), and all sector
+        # metrics from one named aggregation over the last 6; the mean of the last
+        # 5 daily changes telescopes to (latest - first) / (days - 1)
+        recent = self.sector_df.groupby('sector', sort=False, observed=True).tail(7)
+        by_sector = recent.groupby('sector', sort=False, observed=True)
+        metrics = (by_sector.tail(6)
+                   .groupby('sector', sort=False, observed=True)
+                   .agg(days=('breadth', 'size'),
+                        first_breadth=('breadth', 'first'),
+                        latest_breadth=('breadth', 'last')))
+        metrics = metrics[metrics['days'] >= 5]
+        metrics['trend'] = ((metrics['latest_breadth'].astype(np.float64) - metrics['first_breadth'])
+                            / (metrics['days'] - 1))
+        metrics = metrics.loc[sectors[sectors.isin(metrics.index)]]
+        
+        for sector, latest_breadth, trend in zip(metrics.index, metrics['latest_breadth'], metrics['trend']):
             # Momentum score
-            momentum = self._calculate_momentum_pattern(sector_data)
+            momentum = self._calculate_momentum_pattern(by_sector.get_group(sector))
             
             # Calculate score
             score = (
@@ -150,20 +190,17 @@ class MarketIntelligence:
                 reasoning = f"Persistent weakness ({momentum['pattern']}), breadth {latest_breadth:.0f}%"
             
             # Get top stocks for this sector
-            top_stocks = []
-            if latest_stocks is not None and 'sector' in latest_stocks.columns:
-                sector_stocks = latest_stocks[latest_stocks['sector'] == sector].copy()
-                if len(sector_stocks) > 0:
-                    sector_stocks = sector_stocks.sort_values('change_pct', ascending=False)
-                    
-                    # Get top 3 for BUY signals, bottom 3 for SELL signals
-                    if action in ['STRONG BUY', 'BUY']:
-                        top_stocks = sector_stocks.head(3)[['symbol', 'change_pct']].to_dict('records')
-                    elif action in ['STRONG SELL', 'SELL']:
-                        top_stocks = sector_stocks.tail(3)[['symbol', 'change_pct']].to_dict('records')
-                    else:
-                        # For HOLD, show mix of top and bottom
-                        top_stocks = sector_stocks.head(2)[['symbol', 'change_pct']].to_dict('records')
+            best, worst = stocks_by_sector.get(sector, ([], []))
+            
+            # Get top 3 for BUY signals, bottom 3 for SELL signals
+            if action in ['STRONG BUY', 'BUY']:
+                picked = best
+            elif action in ['STRONG SELL', 'SELL']:
+                picked = worst
+            else:
+                # For HOLD, show mix of top and bottom
+                picked = best[:2]
+            top_stocks = [{'symbol': symbol, 'change_pct': change_pct} for symbol, change_pct in picked]
             
             signals.append({
                 'sector': sector,
@@ -178,22 +215,28 @@ class MarketIntelligence:
         
         return sorted(signals, key=lambda x: x['score'], reverse=True)
     
+    def _top_and_bottom_stocks(self, symbols, changes, k=3):
+        """Best and worst k (symbol, change_pct) pairs, each best first, picked without a full sort"""
+        if len(changes) > k:
+            best = np.argpartition(-changes, k - 1)[:k]
+            worst = np.argpartition(changes, k - 1)[:k]
+        else:
+            best = worst = np.arange(len(changes))
+        best = best[np.argsort(-changes[best], kind='stable')]
+        worst = worst[np.argsort(-changes[worst], kind='stable')]
+        return (list(zip(symbols[best].tolist(), changes[best].tolist())),
+                list(zip(symbols[worst].tolist(), changes[worst].tolist())))
+    
     def _calculate_momentum_pattern(self, sector_data):
         """Analyze momentum pattern"""
-        pattern = []
-        for breadth in sector_data['breadth'].tail(7):
-            if breadth >= 65:
-                pattern.append('🟢')
-            elif breadth >= 45:
-                pattern.append('🟡')
-            else:
-                pattern.append('🔴')
-        
-        pattern_str = ''.join(pattern)
+        breadths = sector_data['breadth'].tail(7).to_numpy()
+        green = breadths >= 65
+        red = breadths < 45
+        pattern_str = ''.join(np.select([green, red], ['🟢', '🔴'], default='🟡'))
         
         # Calculate pattern score
-        green_count = pattern_str.count('🟢')
-        red_count = pattern_str.count('🔴')
+        green_count = green.sum()
+        red_count = red.sum()
         
         if green_count >= 5:
             return {'pattern': pattern_str, 'score': 80, 'description': 'Strong uptrend'}
@@ -207,24 +250,17 @@ class MarketIntelligence:
         if len(self.movements_df) < 3:
             return None
         
-        recent = self.movements_df.tail(3)
-        breadths = []
-        
-        for _, row in recent.iterrows():
-            g = row['up_3_5'] + row['up_5_10'] + row['up_10_15'] + row['up_15_plus']
-            l = row['down_3_5'] + row['down_5_10'] + row['down_10_15'] + row['down_15_plus']
-            tm = g + l
-            breadths.append((g / tm * 100) if tm > 0 else 50)
+        breadths = self._breadths[-3:]
         
         # Check for persistent narrow breadth
-        if all(b < 48 for b in breadths):
+        if (breadths < 48).all():
             return {
                 'type': 'BEARISH DIVERGENCE',
                 'severity': 'HIGH',
                 'description': 'Persistent narrow breadth for 3+ days. Weakness likely to continue.',
                 'action': 'Reduce exposure, raise cash'
             }
-        elif all(b < 52 and b > 48 for b in breadths):
+        elif ((breadths < 52) & (breadths > 48)).all():
             return {
                 'type': 'NARROW BREADTH',
                 'severity': 'MEDIUM',
@@ -240,12 +276,7 @@ class MarketIntelligence:
             return None
         
         # Get recent breadths
-        recent_breadths = []
-        for _, row in self.movements_df.tail(10).iterrows():
-            g = row['up_3_5'] + row['up_5_10'] + row['up_10_15'] + row['up_15_plus']
-            l = row['down_3_5'] + row['down_5_10'] + row['down_10_15'] + row['down_15_plus']
-            tm = g + l
-            recent_breadths.append((g / tm * 100) if tm > 0 else 50)
+        recent_breadths = self._breadths[-10:]
         
         current = recent_breadths[-1]
         momentum_5d = np.mean(recent_breadths[-5:])
@@ -277,16 +308,14 @@ class MarketIntelligence:
             return None
         
         # Get latest sector breadths
-        latest_date = self.sector_df['date'].max()
-        latest_sectors = self.sector_df[self.sector_df['date'] == latest_date]
+        breadths = self._latest_sector_breadths
         
         # Calculate concentration
-        breadths = latest_sectors['breadth'].values
         sector_volatility = np.std(breadths)
         
         # Identify extreme positions
-        strong_sectors = len(latest_sectors[latest_sectors['breadth'] >= 65])
-        weak_sectors = len(latest_sectors[latest_sectors['breadth'] <= 35])
+        strong_sectors = int((breadths >= 65).sum())
+        weak_sectors = int((breadths <= 35).sum())
         
         # Risk level
         if sector_volatility > 20 or weak_sectors > strong_sectors:
@@ -322,24 +351,17 @@ class MarketIntelligence:
         if len(self.movements_df) < 30:
             return None
         
-        # Calculate current breadth
-        latest = self.movements_df.iloc[-1]
-        g = latest['up_3_5'] + latest['up_5_10'] + latest['up_10_15'] + latest['up_15_plus']
-        l = latest['down_3_5'] + latest['down_5_10'] + latest['down_10_15'] + latest['down_15_plus']
-        tm = g + l
-        current_breadth = (g / tm * 100) if tm > 0 else 50
+        # Current and historical breadths
+        all_breadths = self._breadths
+        current_breadth = all_breadths[-1]
         
-        # Calculate historical breadths
-        all_breadths = []
-        for _, row in self.movements_df.iterrows():
-            g = row['up_3_5'] + row['up_5_10'] + row['up_10_15'] + row['up_15_plus']
-            l = row['down_3_5'] + row['down_5_10'] + row['down_10_15'] + row['down_15_plus']
-            tm = g + l
-            all_breadths.append((g / tm * 100) if tm > 0 else 50)
+        mean = all_breadths.mean()
+        std = all_breadths.std()
         
-        mean = np.mean(all_breadths)
-        std = np.std(all_breadths)
-        percentile = percentileofscore(all_breadths, current_breadth)
+        # Percentile rank, matching scipy.stats.percentileofscore(kind='rank')
+        below = np.searchsorted(self._sorted_breadths, current_breadth, side='left')
+        at_or_below = np.searchsorted(self._sorted_breadths, current_breadth, side='right')
+        percentile = (below + at_or_below + (at_or_below > below)) * 50.0 / len(all_breadths)
         z_score = (current_breadth - mean) / std if std > 0 else 0
         
         # Interpretation
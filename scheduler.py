@@ -5,37 +5,51 @@ Runs stock_tracker.py at a specified time every day
 
 import schedule
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import subprocess
 import os
 
+# Tracker and visualizer run in this process, so each daily run skips two
+# interpreter start-ups and the pandas/yfinance/matplotlib imports
+from stock_tracker import StockMovementTracker
+from visualize_trends import StockMovementVisualizer
+
+def generate_visualizations():
+    """Generate insights and charts from the saved history"""
+    viz = StockMovementVisualizer()
+    viz.generate_insights()
+    viz.create_all_visualizations()
+
 def run_tracker():
-    """Execute the stock tracker script"""
+    """Execute the stock tracker"""
     print(f"\n{'='*60}")
     print(f"Running Daily Stock Tracker at {datetime.now()}")
     print(f"{'='*60}\n")
     
-    try:
-        # Run the tracker script
-        result = subprocess.run(['python', 'stock_tracker.py'], 
-                              capture_output=True, text=True)
-        
-        print(result.stdout)
+    # Charts only need the history CSV, so they render in a worker process while
+    # the tracker is still writing the detailed stock list
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        visualizations = []
         
-        if result.returncode == 0:
-            print("✅ Tracker completed successfully")
-            
-            # Optionally run visualization after tracking
+        def start_visualizations():
             print("\n🎨 Generating visualizations...")
-            viz_result = subprocess.run(['python', 'visualize_trends.py'], 
-                                       capture_output=True, text=True)
-            print(viz_result.stdout)
-        else:
+            visualizations.append(executor.submit(generate_visualizations))
+        
+        try:
+            # Run the tracker
+            StockMovementTracker().run_daily_tracking(on_history_saved=start_visualizations)
+        except Exception as e:
             print("❌ Tracker failed with errors:")
-            print(result.stderr)
-            
-    except Exception as e:
-        print(f"❌ Error running tracker: {e}")
+            print(e)
+            return
+        
+        print("✅ Tracker completed successfully")
+        
+        try:
+            for future in visualizations:
+                future.result()
+        except Exception as e:
+            print(f"❌ Error generating visualizations: {e}")
 
 def main():
     """Main scheduler function"""
@@ -55,11 +69,15 @@ def main():
     print("🔄 Running initial execution...")
     run_tracker()
     
-    # Keep the scheduler running
+    # Keep the scheduler running, sleeping straight through to the next scheduled run
     try:
         while True:
+            idle = schedule.idle_seconds()
+            if idle is None:
+                break
+            if idle > 0:
+                time.sleep(idle)
             schedule.run_pending()
-            time.sleep(60)  # Check every minute
     except KeyboardInterrupt:
         print("\n\n⛔ Scheduler stopped by user")
 
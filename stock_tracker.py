@@ -5,22 +5,71 @@ Tracks daily stock movements by percentage categories
 
 import yfinance as yf
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import os
+import io
 import time
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, List
 
 class StockMovementTracker:
+    # Tickers per multi-ticker yf.download request
+    BATCH_SIZE = 20
+    # Movement count keys, in the order of the movement category indexes
+    MOVEMENT_KEYS = ['up_15+', 'up_10_15', 'up_5_10', 'up_3_5',
+                     'down_3_5', 'down_5_10', 'down_10_15', 'down_15+', 'neutral']
+    # Bucket edges for searchsorted(side='right'); the negative edges are nudged up one ulp
+    # so -3, -5, ... fall in the losing bucket, matching the inclusive <= -3 thresholds
+    MOVEMENT_EDGES = np.array([np.nextafter(-15, 0), np.nextafter(-10, 0), np.nextafter(-5, 0),
+                               np.nextafter(-3, 0), 3, 5, 10, 15])
+    # MOVEMENT_KEYS index of each bucket, from down_15+ up to up_15+
+    BUCKET_CATEGORIES = np.array([7, 6, 5, 4, 8, 3, 2, 1, 0])
+    # Major NSE stocks (Yahoo Finance tickers) used when the Nifty 500 list is unavailable
+    FALLBACK_STOCKS = tuple(stock + '.NS' for stock in (
+        'RELIANCE', 'TCS', 'HDFCBANK', 'INFY', 'HINDUNILVR', 'ICICIBANK',
+        'KOTAKBANK', 'SBIN', 'BHARTIARTL', 'BAJFINANCE', 'ITC', 'ASIANPAINT',
+        'MARUTI', 'AXISBANK', 'LT', 'TITAN', 'SUNPHARMA', 'ULTRACEMCO',
+        'NESTLEIND', 'WIPRO', 'TATAMOTORS', 'HCLTECH', 'ADANIENT', 'ONGC',
+        'NTPC', 'POWERGRID', 'BAJAJFINSV', 'M&M', 'COALINDIA', 'DRREDDY',
+        'JSWSTEEL', 'TATASTEEL', 'INDUSINDBK', 'TECHM', 'HINDALCO', 'ADANIPORTS',
+        'EICHERMOT', 'APOLLOHOSP', 'GRASIM', 'CIPLA', 'DIVISLAB', 'HEROMOTOCO',
+        'BRITANNIA', 'SHREECEM', 'BPCL', 'TATACONSUM', 'UPL', 'BAJAJ-AUTO',
+        'PIDILITIND', 'SIEMENS'
+    ))
+    
     def __init__(self, data_file='stock_movements_history.csv'):
         self.data_file = data_file
         self.stock_list = []
+        # On-disk cache of downloaded closes, so re-runs (e.g. after a crash) skip finished batches;
+        # kept short-lived because a run during market hours caches intraday prices
+        self.cache_dir = '.cache'
+        self.cache_ttl = 60 * 60  # seconds
+        self.stock_list_ttl = 24 * 60 * 60  # index constituents change at most quarterly
+        self.session = self._create_session()
         
     def fetch_nifty_500_stocks(self) -> List[str]:
         """Fetch list of Nifty 500 stocks"""
+        url = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
+        df = self._read_cache(url, ttl=self.stock_list_ttl)
+        if df is not None:
+            print(f"Using cached Nifty 500 stock list ({len(df)} stocks)")
+            return [symbol + '.NS' for symbol in df['Symbol'].tolist()]
+        
         try:
             print("Fetching Nifty 500 stock list...")
-            url = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
-            df = pd.read_csv(url)
+            # Fetched through the pooled session (browser headers, retries) and parsed
+            # by pyarrow's multithreaded reader. The cache entry is shared with the sector
+            # scripts (same URL key), so Industry is kept even though only Symbol is used here
+            response = self.session.get(url, timeout=30)
+            response.raise_for_status()
+            df = pd.read_csv(io.BytesIO(response.content), usecols=['Symbol', 'Industry'], engine='pyarrow',
+                             dtype={'Symbol': 'string', 'Industry': 'category'})
+            df['Industry'] = df['Industry'].cat.add_categories(['Other']).fillna('Other')
+            self._write_cache(url, df)
             
             # Add .NS suffix for Yahoo Finance
             stocks = [symbol + '.NS' for symbol in df['Symbol'].tolist()]
@@ -28,96 +77,159 @@ class StockMovementTracker:
             return stocks
         except Exception as e:
             print(f"Error fetching stock list: {e}")
+            # An outdated cached list beats the much shorter fallback list
+            df = self._read_cache(url, ttl=float('inf'))
+            if df is not None:
+                print(f"Using previously cached stock list ({len(df)} stocks)")
+                return [symbol + '.NS' for symbol in df['Symbol'].tolist()]
             # Fallback to Nifty 50 major stocks
             return self._get_fallback_stocks()
     
     def _get_fallback_stocks(self) -> List[str]:
         """Fallback list of major NSE stocks"""
-        major_stocks = [
-            'RELIANCE', 'TCS', 'HDFCBANK', 'INFY', 'HINDUNILVR', 'ICICIBANK',
-            'KOTAKBANK', 'SBIN', 'BHARTIARTL', 'BAJFINANCE', 'ITC', 'ASIANPAINT',
-            'MARUTI', 'AXISBANK', 'LT', 'TITAN', 'SUNPHARMA', 'ULTRACEMCO',
-            'NESTLEIND', 'WIPRO', 'TATAMOTORS', 'HCLTECH', 'ADANIENT', 'ONGC',
-            'NTPC', 'POWERGRID', 'BAJAJFINSV', 'M&M', 'COALINDIA', 'DRREDDY',
-            'JSWSTEEL', 'TATASTEEL', 'INDUSINDBK', 'TECHM', 'HINDALCO', 'ADANIPORTS',
-            'EICHERMOT', 'APOLLOHOSP', 'GRASIM', 'CIPLA', 'DIVISLAB', 'HEROMOTOCO',
-            'BRITANNIA', 'SHREECEM', 'BPCL', 'TATACONSUM', 'UPL', 'BAJAJ-AUTO',
-            'PIDILITIND', 'SIEMENS'
-        ]
-        return [stock + '.NS' for stock in major_stocks]
+        return list(self.FALLBACK_STOCKS)
+    
+    def _create_session(self) -> requests.Session:
+        """Pooled HTTP session with retry/backoff, shared by all Yahoo Finance downloads"""
+        # Sleeps only when Yahoo pushes back: 429/503 responses wait out their Retry-After
+        # header, other failures back off exponentially
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+                      respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
+        
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                          '(KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        return session
+    
+    def _cache_path(self, key: str) -> str:
+        """Cache file for a request key"""
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.parquet')
+    
+    def _read_cache(self, key: str, ttl=None):
+        """Return the cached DataFrame for a key, or None if missing or older than the TTL"""
+        path = self._cache_path(key)
+        ttl = self.cache_ttl if ttl is None else ttl
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > ttl:
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            return None
+    
+    def _write_cache(self, key: str, df: pd.DataFrame):
+        """Persist a DataFrame under a request key"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df.to_parquet(self._cache_path(key), engine='pyarrow', compression='snappy')
+    
+    def _download_batch(self, batch: List[str], period: str):
+        """Closing prices for one batch of tickers, or None if nothing came back"""
+        for attempt in range(2):
+            panel = yf.download(batch, period=period, group_by='ticker', threads=True,
+                                progress=False, auto_adjust=True, session=self.session)
+            if not panel.empty or attempt == 1:
+                break
+            # An entirely empty batch is usually rate limiting; back off once and retry
+            time.sleep(5)
+        
+        if panel.empty:
+            return None
+        if isinstance(panel.columns, pd.MultiIndex):
+            return panel.xs('Close', level=1, axis=1)
+        return panel[['Close']].set_axis(batch, axis=1)
+    
+    def download_closes(self, stocks: List[str]) -> pd.DataFrame:
+        """Recent closing prices as a (dates x tickers) frame, downloaded in batches"""
+        frames = []
+        for start in range(0, len(stocks), self.BATCH_SIZE):
+            batch = stocks[start:start + self.BATCH_SIZE]
+            
+            cache_key = f"{','.join(batch)}:closes:{datetime.now().date()}"
+            closes = self._read_cache(cache_key)
+            if closes is not None:
+                frames.append(closes)
+                continue
+            
+            # Only the last two closes are used, so fetch two sessions
+            closes = self._download_batch(batch, '2d')
+            if closes is None:
+                continue
+            
+            # Widen to five days only for stocks that came back with fewer than two
+            # closes (a holiday or a missing bar inside the two-day window)
+            short = [ticker for ticker in batch if ticker not in closes or closes[ticker].count() < 2]
+            if short:
+                wider = self._download_batch(short, '5d')
+                if wider is not None:
+                    closes = pd.concat([closes.drop(columns=short, errors='ignore'), wider], axis=1)
+            
+            if closes.notna().any().any():
+                self._write_cache(cache_key, closes)
+            frames.append(closes)
+            print(f"Downloaded {min(start + self.BATCH_SIZE, len(stocks))}/{len(stocks)} stocks...")
+        
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
     
     def calculate_daily_movements(self, stocks: List[str]) -> Dict:
         """Calculate stock movements for the day"""
         print(f"\nProcessing {len(stocks)} stocks...")
         
-        movements = {
-            'up_15+': 0, 'up_10_15': 0, 'up_5_10': 0, 'up_3_5': 0,
-            'down_3_5': 0, 'down_5_10': 0, 'down_10_15': 0, 'down_15+': 0,
-            'neutral': 0
-        }
+        # Recent closes for every stock, then each stock's latest % change
+        closes = self.download_closes(stocks).reindex(columns=stocks)
+        pct_changes = self._last_changes(closes).to_numpy()
         
-        stock_details = []
-        processed = 0
-        successful = 0
-        
-        for stock in stocks:
-            try:
-                # Download last 5 days of data
-                data = yf.download(stock, period='5d', progress=False, auto_adjust=True)
-                
-                if data is not None and len(data) >= 2:
-                    # Get the last two closing prices
-                    prev_close = float(data['Close'].iloc[-2])
-                    curr_close = float(data['Close'].iloc[-1])
-                    
-                    # Calculate percentage change
-                    pct_change = ((curr_close - prev_close) / prev_close) * 100
-                    
-                    # Categorize movement
-                    category = self._categorize_movement(pct_change)
-                    movements[category] += 1
-                    
-                    stock_details.append({
-                        'symbol': stock.replace('.NS', ''),
-                        'change_pct': round(pct_change, 2),
-                        'category': category
-                    })
-                    
-                    successful += 1
-                
-                processed += 1
-                if processed % 50 == 0:
-                    print(f"Processed {processed}/{len(stocks)} stocks... ({successful} successful)")
-                    time.sleep(1)  # Rate limiting
-                    
-            except Exception as e:
-                # Skip stocks with errors silently
-                processed += 1
-                continue
+        # Skip stocks without two closes (or a zero previous close)
+        processed = np.isfinite(pct_changes)
+        pct_changes = pct_changes[processed]
+        successful = len(pct_changes)
+        
+        # Categorize and count all movements at once
+        categories = self._categorize_movements(pct_changes)
+        counts = np.bincount(categories, minlength=len(self.MOVEMENT_KEYS))
+        movements = dict(zip(self.MOVEMENT_KEYS, counts.tolist()))
+        
+        # Per-stock details stay a typed DataFrame all the way to the CSV writer
+        stock_details = pd.DataFrame({
+            'symbol': [stock.replace('.NS', '') for stock in np.array(stocks)[processed]],
+            'change_pct': pct_changes.round(2),
+            'category': pd.Categorical.from_codes(categories, self.MOVEMENT_KEYS)
+        })
         
         print(f"\nSuccessfully processed {successful} out of {len(stocks)} stocks")
         return movements, stock_details
     
-    def _categorize_movement(self, pct_change: float) -> str:
-        """Categorize stock movement by percentage"""
-        if pct_change >= 15:
-            return 'up_15+'
-        elif pct_change >= 10:
-            return 'up_10_15'
-        elif pct_change >= 5:
-            return 'up_5_10'
-        elif pct_change >= 3:
-            return 'up_3_5'
-        elif pct_change <= -15:
-            return 'down_15+'
-        elif pct_change <= -10:
-            return 'down_10_15'
-        elif pct_change <= -5:
-            return 'down_5_10'
-        elif pct_change <= -3:
-            return 'down_3_5'
-        else:
-            return 'neutral'
+    def _last_changes(self, closes: pd.DataFrame) -> pd.Series:
+        """Percentage change between each stock's last two closes (NaN with fewer than two)"""
+        valid = closes.notna()
+        # Position of each close among the stock's trading days, counted from the latest
+        from_end = valid[::-1].cumsum()[::-1].where(valid)
+        curr_close = closes.where(from_end == 1).max()
+        prev_close = closes.where(from_end == 2).max()
+        return (curr_close - prev_close) / prev_close * 100
+    
+    def _categorize_movements(self, pct_changes: np.ndarray) -> np.ndarray:
+        """Map percentage changes to indexes into MOVEMENT_KEYS (all stocks at once)"""
+        # One branchless binary search per change, then a table lookup
+        return self.BUCKET_CATEGORIES[np.searchsorted(self.MOVEMENT_EDGES, pct_changes, side='right')]
+    
+    def _can_append(self, csv_file: str, today, columns: List[str]) -> bool:
+        """Whether today's rows can be appended to a history file without rewriting it"""
+        if not os.path.exists(csv_file) or pd.read_csv(csv_file, nrows=0).columns.tolist() != columns:
+            return False
+        
+        # Only the tail is read: the last row's date must be an earlier day, and the
+        # file must end with a newline so the appended row starts on its own line
+        with open(csv_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            tail = f.read()
+        last_date = tail.splitlines()[-1].split(b',')[0].decode()
+        return tail.endswith(b'\n') and last_date != today.strftime('%Y-%m-%d')
     
     def save_daily_data(self, movements: Dict):
         """Save daily movement data to CSV"""
@@ -137,18 +249,23 @@ class StockMovementTracker:
             'neutral': movements['neutral']
         }
         
-        # Check if file exists
-        if os.path.exists(self.data_file):
-            df = pd.read_csv(self.data_file)
-            # Update if today's data exists, else append
-            if today.strftime('%Y-%m-%d') in df['date'].values:
-                df.loc[df['date'] == today.strftime('%Y-%m-%d')] = list(row.values())
-            else:
-                df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+        if self._can_append(self.data_file, today, list(row)):
+            # New day: append the row without reading the history
+            pd.DataFrame([row]).to_csv(self.data_file, mode='a', header=False, index=False)
         else:
-            df = pd.DataFrame([row])
-        
-        df.to_csv(self.data_file, index=False)
+            # Check if file exists
+            # Indexed by date, so finding today's row is a hash lookup rather than a column scan
+            if os.path.exists(self.data_file):
+                df = pd.read_csv(self.data_file, index_col='date')
+                # Update if today's data exists, else append
+                if today.strftime('%Y-%m-%d') in df.index:
+                    df.loc[today.strftime('%Y-%m-%d')] = list(row.values())[1:]
+                else:
+                    df = pd.concat([df, pd.DataFrame([row]).set_index('date')])
+            else:
+                df = pd.DataFrame([row]).set_index('date')
+            
+            df.to_csv(self.data_file)
         print(f"\n✅ Data saved to {self.data_file}")
     
     def display_summary(self, movements: Dict):
@@ -187,8 +304,12 @@ class StockMovementTracker:
                 print("   Mixed/Neutral sentiment ➡️")
         print()
     
-    def run_daily_tracking(self):
-        """Main function to run daily tracking"""
+    def run_daily_tracking(self, on_history_saved=None):
+        """Main function to run daily tracking
+        
+        on_history_saved, if given, is called once the history CSV is written and
+        before the detailed stock list is saved.
+        """
         print("="*60)
         print("Starting Daily Stock Movement Tracker...")
         print(f"Timestamp: {datetime.now()}")
@@ -206,11 +327,13 @@ class StockMovementTracker:
         
         # Save data
         self.save_daily_data(movements)
+        if on_history_saved:
+            on_history_saved()
         
         # Save detailed stock list
-        if details:
+        if not details.empty:
             details_file = f"stock_details_{datetime.now().date()}.csv"
-            pd.DataFrame(details).to_csv(details_file, index=False)
+            details.to_csv(details_file, index=False)
             print(f"✅ Detailed stock data saved to {details_file}")
         
         print("\n" + "="*60)
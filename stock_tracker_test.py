@@ -14,7 +14,10 @@ results = []
 for stock in stocks:
     try:
         print(f"Downloading {stock}...")
-        data = yf.download(stock, period='5d', progress=False)
+        data = yf.download(stock, period='2d', progress=False)
+        if len(data) < 2:
+            # A holiday inside the two-day window; look back a few more days
+            data = yf.download(stock, period='5d', progress=False)
         if len(data) >= 2:
             prev_close = data['Close'].iloc[-2]
             curr_close = data['Close'].iloc[-1]
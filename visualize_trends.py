@@ -3,11 +3,46 @@ Stock Movement Visualization and Trend Analysis
 Generates charts and insights from historical tracking data
 """
 
+import os
 import pandas as pd
+import numpy as np
+import matplotlib
+
+# Charts are rendered straight to PNG with the non-interactive Agg backend, skipping GUI
+# start-up; set SHOW_DASHBOARD=1 to also open the dashboard in a window
+SHOW_DASHBOARD = bool(os.environ.get('SHOW_DASHBOARD'))
+if not SHOW_DASHBOARD:
+    matplotlib.use('Agg')
+
 import matplotlib.pyplot as plt
-import seaborn as sns
+import matplotlib.dates as mdates
+from matplotlib.ticker import MaxNLocator
 from datetime import datetime, timedelta
-import os
+
+# Movement columns, top to bottom as in the distribution heatmap
+CATEGORIES = ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5',
+              'neutral', 'down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus']
+# Movement columns summed into daily gainer/loser totals
+UP_COLS = ['up_3_5', 'up_5_10', 'up_10_15', 'up_15_plus']
+DOWN_COLS = ['down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus']
+# Their positions in CATEGORIES, i.e. columns of the per-day counts matrix
+UP_IDX = [CATEGORIES.index(col) for col in UP_COLS]
+DOWN_IDX = [CATEGORIES.index(col) for col in DOWN_COLS]
+# Count columns are parsed straight to int16 (a few hundred stocks per bucket at most)
+# rather than the default int64
+COUNT_DTYPES = {col: 'int16' for col in CATEGORIES}
+# Longer histories are drawn as plain lines: a marker per day adds a glyph per point
+# and just blurs into the line
+MARKER_MAX_DAYS = 60
+
+
+def moving_average(values, window):
+    """Trailing mean over up to `window` values (rolling(window, min_periods=1).mean())"""
+    csum = np.cumsum(values, dtype=np.float64)
+    sums = csum.copy()
+    sums[window:] -= csum[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
 
 class StockMovementVisualizer:
     def __init__(self, data_file='stock_movements_history.csv'):
@@ -15,138 +50,178 @@ class StockMovementVisualizer:
         self.df = None
         
     def load_data(self):
-        """Load historical data"""
+        """Load historical data (once; insights and charts share it)"""
+        if self.df is not None:
+            return True
         if not os.path.exists(self.data_file):
             print(f"Error: {self.data_file} not found!")
             print("Run stock_tracker.py first to collect data.")
             return False
         
-        self.df = pd.read_csv(self.data_file)
-        self.df['date'] = pd.to_datetime(self.df['date'])
+        # The backfill scripts keep a typed Parquet copy of the history; the daily
+        # tracker only updates the CSV, so a copy older than the CSV is stale
+        parquet_file = os.path.splitext(self.data_file)[0] + '.parquet'
+        if os.path.exists(parquet_file) and os.path.getmtime(parquet_file) >= os.path.getmtime(self.data_file):
+            # The backfill writes its counts as int32; match the CSV path's types
+            self.df = pd.read_parquet(parquet_file).astype(COUNT_DTYPES)
+        else:
+            # Dates and count types are handled by the multithreaded Arrow reader; a file
+            # with missing counts can't be read as integers, so it falls back to default types
+            try:
+                self.df = pd.read_csv(self.data_file, engine='pyarrow',
+                                      parse_dates=['date'], dtype=COUNT_DTYPES)
+            except Exception:
+                self.df = pd.read_csv(self.data_file, parse_dates=['date'])
+        
+        # (days x categories) counts matrix, converted from pandas once and kept in the
+        # parsed integer type; the daily totals shared by every chart and the insights
+        # are float32 reductions over its columns
+        self.counts = self.df[CATEGORIES].to_numpy()
+        self.gainers = self.counts[:, UP_IDX].sum(axis=1, dtype=np.float32)
+        self.losers = self.counts[:, DOWN_IDX].sum(axis=1, dtype=np.float32)
+        self.total_movers = self.gainers + self.losers
+        # Matplotlib date numbers, converted once instead of by every date-axis artist
+        self.xdates = mdates.date2num(self.df['date'].to_numpy())
         print(f"Loaded {len(self.df)} days of data")
         return True
     
     def create_all_visualizations(self):
         """Generate all visualization charts"""
+        # Today's dashboard is still current if it was saved after the history (or its
+        # Parquet copy) last changed
+        output_file = f'stock_movement_dashboard_{datetime.now().date()}.png'
+        sources = [self.data_file, os.path.splitext(self.data_file)[0] + '.parquet']
+        data_mtime = max((os.path.getmtime(f) for f in sources if os.path.exists(f)), default=None)
+        if data_mtime is not None and os.path.exists(output_file) and os.path.getmtime(output_file) >= data_mtime:
+            print(f"\n📊 Dashboard is up to date: {output_file}")
+            return
+        
         if not self.load_data():
             return
         
         # Set style
-        sns.set_style("whitegrid")
+        plt.style.use('seaborn-v0_8-whitegrid')
         plt.rcParams['figure.figsize'] = (15, 10)
         
-        # Create subplots
-        fig = plt.figure(figsize=(18, 12))
+        # Create all subplots at once; the four date panels share one x-axis (and its
+        # tick locator/formatter), while the heatmap and weekday bars keep their own
+        fig, ((ax1, ax2), (ax3, ax4), (ax5, ax6)) = plt.subplots(3, 2, figsize=(18, 12))
+        date_axes = [ax1, ax2, ax4, ax5]
+        ax1.xaxis_date()
+        for ax in date_axes[1:]:
+            ax.sharex(ax1)
         
         # 1. Market Breadth Trend (Gainers vs Losers over time)
-        ax1 = plt.subplot(3, 2, 1)
         self._plot_market_breadth(ax1)
         
         # 2. Extreme Movements Trend (15%+ moves)
-        ax2 = plt.subplot(3, 2, 2)
         self._plot_extreme_movements(ax2)
         
         # 3. Distribution Heatmap
-        ax3 = plt.subplot(3, 2, 3)
         self._plot_distribution_heatmap(ax3)
         
         # 4. Advance-Decline Line
-        ax4 = plt.subplot(3, 2, 4)
         self._plot_advance_decline(ax4)
         
         # 5. Volatility Trend (Total movers 3%+)
-        ax5 = plt.subplot(3, 2, 5)
         self._plot_volatility_trend(ax5)
         
         # 6. Weekly Pattern Analysis
-        ax6 = plt.subplot(3, 2, 6)
         self._plot_weekly_pattern(ax6)
         
+        for ax in date_axes:
+            ax.tick_params(axis='x', labelrotation=45)
         plt.tight_layout()
         
         # Save figure
-        output_file = f'stock_movement_dashboard_{datetime.now().date()}.png'
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
+        # Screen resolution is plenty for a dashboard PNG; light zlib compression keeps
+        # encoding from dominating the save time
+        plt.savefig(output_file, dpi=150, bbox_inches='tight', pil_kwargs={'compress_level': 1})
         print(f"\n📊 Dashboard saved as: {output_file}")
         
-        plt.show()
+        if SHOW_DASHBOARD:
+            plt.show()
+        plt.close(fig)
     
     def _plot_market_breadth(self, ax):
         """Plot gainers vs losers over time"""
-        gainers = self.df['up_3_5'] + self.df['up_5_10'] + self.df['up_10_15'] + self.df['up_15_plus']
-        losers = self.df['down_3_5'] + self.df['down_5_10'] + self.df['down_10_15'] + self.df['down_15_plus']
+        gainers, losers = self.gainers, self.losers
+        show_markers = len(self.df) <= MARKER_MAX_DAYS
         
-        ax.plot(self.df['date'], gainers, label='Gainers (3%+)', color='green', linewidth=2, marker='o')
-        ax.plot(self.df['date'], losers, label='Losers (3%+)', color='red', linewidth=2, marker='o')
-        ax.fill_between(self.df['date'], gainers, alpha=0.3, color='green')
-        ax.fill_between(self.df['date'], losers, alpha=0.3, color='red')
+        ax.plot(self.xdates, gainers, label='Gainers (3%+)', color='green', linewidth=2, marker='o' if show_markers else None)
+        ax.plot(self.xdates, losers, label='Losers (3%+)', color='red', linewidth=2, marker='o' if show_markers else None)
+        ax.fill_between(self.xdates, gainers, alpha=0.3, color='green')
+        ax.fill_between(self.xdates, losers, alpha=0.3, color='red')
         
         ax.set_title('Market Breadth: Gainers vs Losers (3%+ moves)', fontsize=12, fontweight='bold')
         ax.set_xlabel('Date')
         ax.set_ylabel('Number of Stocks')
         ax.legend()
         ax.grid(True, alpha=0.3)
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
     
     def _plot_extreme_movements(self, ax):
         """Plot extreme movements (15%+) over time"""
-        ax.plot(self.df['date'], self.df['up_15_plus'], label='Up 15%+', 
-                color='darkgreen', linewidth=2, marker='^', markersize=8)
-        ax.plot(self.df['date'], self.df['down_15_plus'], label='Down 15%+', 
-                color='darkred', linewidth=2, marker='v', markersize=8)
+        show_markers = len(self.df) <= MARKER_MAX_DAYS
+        ax.plot(self.xdates, self.counts[:, CATEGORIES.index('up_15_plus')], label='Up 15%+', 
+                color='darkgreen', linewidth=2, marker='^' if show_markers else None, markersize=8)
+        ax.plot(self.xdates, self.counts[:, CATEGORIES.index('down_15_plus')], label='Down 15%+', 
+                color='darkred', linewidth=2, marker='v' if show_markers else None, markersize=8)
         
         ax.set_title('Extreme Movements (15%+)', fontsize=12, fontweight='bold')
         ax.set_xlabel('Date')
         ax.set_ylabel('Number of Stocks')
         ax.legend()
         ax.grid(True, alpha=0.3)
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
     
     def _plot_distribution_heatmap(self, ax):
         """Create heatmap of stock distribution across categories"""
-        categories = ['up_15_plus', 'up_10_15', 'up_5_10', 'up_3_5', 
-                     'neutral', 'down_3_5', 'down_5_10', 'down_10_15', 'down_15_plus']
-        
-        heatmap_data = self.df[categories].T
-        
-        sns.heatmap(heatmap_data, cmap='RdYlGn', center=heatmap_data.mean().mean(),
-                   cbar_kws={'label': 'Stock Count'}, ax=ax, annot=False)
+        # Already in heatmap row order; drawn as a single image rather than a mesh of cells
+        heatmap_data = self.counts.T
+        
+        # Color scale centered on the mean count, with the colorbar spanning only the
+        # counts that occur
+        center = heatmap_data.mean()
+        vrange = max(heatmap_data.max() - center, center - heatmap_data.min())
+        im = ax.imshow(heatmap_data, cmap='RdYlGn', aspect='auto', interpolation='nearest',
+                       vmin=center - vrange, vmax=center + vrange)
+        cbar = ax.figure.colorbar(im, ax=ax, label='Stock Count', ticks=MaxNLocator(),
+                                  boundaries=np.linspace(heatmap_data.min(), heatmap_data.max(), 256))
+        cbar.outline.set_visible(False)
+        ax.grid(False)
+        ax.spines[:].set_visible(False)
         
         ax.set_title('Distribution Heatmap (Darker = More Stocks)', fontsize=12, fontweight='bold')
         ax.set_xlabel('Date Index')
+        ax.set_yticks(range(len(CATEGORIES)))
         ax.set_yticklabels(['↑15%+', '↑10-15%', '↑5-10%', '↑3-5%', 
                            'Neutral', '↓3-5%', '↓5-10%', '↓10-15%', '↓15%+'], rotation=0)
     
     def _plot_advance_decline(self, ax):
         """Plot cumulative advance-decline line"""
-        gainers = self.df['up_3_5'] + self.df['up_5_10'] + self.df['up_10_15'] + self.df['up_15_plus']
-        losers = self.df['down_3_5'] + self.df['down_5_10'] + self.df['down_10_15'] + self.df['down_15_plus']
-        
-        daily_diff = gainers - losers
+        daily_diff = self.gainers - self.losers
         cumulative_ad = daily_diff.cumsum()
         
-        ax.plot(self.df['date'], cumulative_ad, linewidth=2.5, color='blue')
+        ax.plot(self.xdates, cumulative_ad, linewidth=2.5, color='blue')
         ax.axhline(y=0, color='black', linestyle='--', alpha=0.5)
-        ax.fill_between(self.df['date'], cumulative_ad, 0, 
-                       where=(cumulative_ad >= 0), alpha=0.3, color='green', label='Bullish')
-        ax.fill_between(self.df['date'], cumulative_ad, 0, 
-                       where=(cumulative_ad < 0), alpha=0.3, color='red', label='Bearish')
+        # One comparison serves both fills (the bearish side is its complement)
+        bullish = cumulative_ad >= 0
+        ax.fill_between(self.xdates, cumulative_ad, 0, interpolate=False,
+                       where=bullish, alpha=0.3, color='green', label='Bullish')
+        ax.fill_between(self.xdates, cumulative_ad, 0, interpolate=False,
+                       where=~bullish, alpha=0.3, color='red', label='Bearish')
         
         ax.set_title('Cumulative Advance-Decline Line', fontsize=12, fontweight='bold')
         ax.set_xlabel('Date')
         ax.set_ylabel('Cumulative Difference')
         ax.legend()
         ax.grid(True, alpha=0.3)
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
     
     def _plot_volatility_trend(self, ax):
         """Plot overall market volatility (total stocks moving 3%+)"""
-        total_movers = (self.df['up_3_5'] + self.df['up_5_10'] + self.df['up_10_15'] + 
-                       self.df['up_15_plus'] + self.df['down_3_5'] + self.df['down_5_10'] + 
-                       self.df['down_10_15'] + self.df['down_15_plus'])
+        total_movers = self.total_movers
         
-        ax.bar(self.df['date'], total_movers, color='purple', alpha=0.6)
-        ax.plot(self.df['date'], total_movers.rolling(window=5, min_periods=1).mean(), 
+        ax.bar(self.xdates, total_movers, color='purple', alpha=0.6)
+        ax.plot(self.xdates, moving_average(total_movers, 5), 
                color='orange', linewidth=3, label='5-day MA')
         
         ax.set_title('Market Volatility (Total Stocks Moving 3%+)', fontsize=12, fontweight='bold')
@@ -154,7 +229,6 @@ class StockMovementVisualizer:
         ax.set_ylabel('Number of Stocks')
         ax.legend()
         ax.grid(True, alpha=0.3, axis='y')
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
     
     def _plot_weekly_pattern(self, ax):
         """Analyze patterns by day of week"""
@@ -164,26 +238,22 @@ class StockMovementVisualizer:
             ax.set_title('Weekly Pattern Analysis', fontsize=12, fontweight='bold')
             return
         
-        self.df['day_of_week'] = self.df['date'].dt.day_name()
-        
-        gainers = self.df['up_3_5'] + self.df['up_5_10'] + self.df['up_10_15'] + self.df['up_15_plus']
-        losers = self.df['down_3_5'] + self.df['down_5_10'] + self.df['down_10_15'] + self.df['down_15_plus']
-        
-        weekly_data = pd.DataFrame({
-            'day': self.df['day_of_week'],
-            'gainers': gainers,
-            'losers': losers
-        })
-        
+        # Per-weekday means (Monday=0) from weighted bincounts; weekdays without data stay
+        # NaN so they draw no bar. The day names are only tick labels
         day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-        weekly_avg = weekly_data.groupby('day').mean().reindex(day_order)
-        
-        x = range(len(weekly_avg))
+        dow = self.df['date'].dt.dayofweek.to_numpy()
+        days = np.bincount(dow, minlength=7)[:5]
+        gainer_sums = np.bincount(dow, weights=self.gainers, minlength=7)[:5]
+        loser_sums = np.bincount(dow, weights=self.losers, minlength=7)[:5]
+        avg_gainers = np.divide(gainer_sums, days, out=np.full(5, np.nan), where=days > 0)
+        avg_losers = np.divide(loser_sums, days, out=np.full(5, np.nan), where=days > 0)
+        
+        x = range(len(day_order))
         width = 0.35
         
-        ax.bar([i - width/2 for i in x], weekly_avg['gainers'], width, 
+        ax.bar([i - width/2 for i in x], avg_gainers, width, 
               label='Avg Gainers', color='green', alpha=0.7)
-        ax.bar([i + width/2 for i in x], weekly_avg['losers'], width, 
+        ax.bar([i + width/2 for i in x], avg_losers, width, 
               label='Avg Losers', color='red', alpha=0.7)
         
         ax.set_title('Average Gainers/Losers by Day of Week', fontsize=12, fontweight='bold')
@@ -203,27 +273,23 @@ class StockMovementVisualizer:
         print("📈 MARKET INSIGHTS & TREND ANALYSIS")
         print("="*70)
         
-        # Latest data
-        latest = self.df.iloc[-1]
-        print(f"\n📅 Latest Data ({latest['date'].date()}):")
+        # Latest data (a row of the counts matrix)
+        latest = self.counts[-1]
+        print(f"\n📅 Latest Data ({self.df['date'].iloc[-1].date()}):")
         
-        gainers = latest['up_3_5'] + latest['up_5_10'] + latest['up_10_15'] + latest['up_15_plus']
-        losers = latest['down_3_5'] + latest['down_5_10'] + latest['down_10_15'] + latest['down_15_plus']
+        gainers = self.gainers[-1]
+        losers = self.losers[-1]
         
         print(f"   Gainers (3%+): {int(gainers)} stocks")
         print(f"   Losers (3%+): {int(losers)} stocks")
-        print(f"   Extreme gains (15%+): {int(latest['up_15_plus'])} stocks")
-        print(f"   Extreme losses (15%+): {int(latest['down_15_plus'])} stocks")
+        print(f"   Extreme gains (15%+): {int(latest[CATEGORIES.index('up_15_plus')])} stocks")
+        print(f"   Extreme losses (15%+): {int(latest[CATEGORIES.index('down_15_plus')])} stocks")
         
         # Trend analysis (last 5 days if available)
         if len(self.df) >= 5:
             print(f"\n📊 5-Day Trend:")
-            recent = self.df.tail(5)
-            
-            avg_gainers = (recent['up_3_5'] + recent['up_5_10'] + 
-                          recent['up_10_15'] + recent['up_15_plus']).mean()
-            avg_losers = (recent['down_3_5'] + recent['down_5_10'] + 
-                         recent['down_10_15'] + recent['down_15_plus']).mean()
+            avg_gainers = self.gainers[-5:].mean()
+            avg_losers = self.losers[-5:].mean()
             
             print(f"   Average gainers: {avg_gainers:.1f} stocks/day")
             print(f"   Average losers: {avg_losers:.1f} stocks/day")
@@ -238,12 +304,8 @@ class StockMovementVisualizer:
         # Volatility analysis
         if len(self.df) >= 2:
             print(f"\n🌊 Volatility Analysis:")
-            total_movers = (self.df['up_3_5'] + self.df['up_5_10'] + self.df['up_10_15'] + 
-                          self.df['up_15_plus'] + self.df['down_3_5'] + self.df['down_5_10'] + 
-                          self.df['down_10_15'] + self.df['down_15_plus'])
-            
-            avg_volatility = total_movers.mean()
-            latest_volatility = total_movers.iloc[-1]
+            avg_volatility = self.total_movers.mean()
+            latest_volatility = self.total_movers[-1]
             
             print(f"   Average daily movers (3%+): {avg_volatility:.1f} stocks")
             print(f"   Latest: {int(latest_volatility)} stocks")